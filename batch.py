@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+batch.py
+Batch mode for run_all.py --batch MANIFEST: converts many guides in one run.
+The manifest is a JSON list of guides, paths relative to the manifest:
+
+  [{"in": "guides/cooks_assistant.txt", "classname": "CooksAssistant"},
+   {"parsed": "guides/dragon_slayer_parsed.json", "classname": "DragonSlayer", "out": "DS.java"}]
+
+"in" is cleaned wikitext, "parsed" a steps_parsed.json; "out" defaults to
+<classname>.java in --out-dir. worldpoints.json, OSRS ID List.json,
+entity_xref.json and the RuneLite ID files are loaded once; the guides are
+then converted by a pool of forked workers that inherit them, and one Java
+class is written per guide.
+"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import generate_java
+import jsonio
+import parse_steps
+import profiling
+import resolve_entities
+import validate_java
+import xref
+
+# Loaded once in the parent and inherited by the forked workers.
+_state: Dict[str, Any] = {}
+
+def load_manifest(path: Path, out_dir: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Guides as {"name", "input", "parsed", "classname", "out"} with resolved paths."""
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of guides")
+    base = path.parent
+    out_dir = Path(out_dir) if out_dir is not None else base
+    guides, seen = [], set()
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or "classname" not in entry or ("in" in entry) == ("parsed" in entry):
+            raise ValueError(f"{path}: guide {i} needs a classname and exactly one of 'in' or 'parsed'")
+        out = base / entry["out"] if "out" in entry else out_dir / f"{entry['classname']}.java"
+        if out in seen:
+            raise ValueError(f"{path}: guide {i} writes {out} again")
+        seen.add(out)
+        guides.append({
+            "name": entry.get("name") or entry["classname"],
+            "input": base / entry["in"] if "in" in entry else None,
+            "parsed": base / entry["parsed"] if "parsed" in entry else None,
+            "classname": entry["classname"],
+            "out": out,
+        })
+    return guides
+
+def load_state(world_path: Path, items_path: Path, root: Path, validate: bool = False) -> None:
+    _state["databases"] = (
+        resolve_entities.load_entities(str(world_path), "npcs"),
+        resolve_entities.load_entities(str(world_path), "objects"),
+        resolve_entities.load_items(str(items_path)),
+        xref.XrefIndex.load_if_exists(xref.default_path(world_path)),
+    )
+    # Entities missing from worldpoints.json are looked up in these; parse them before forking.
+    for category in ("npcs", "objects"):
+        id_path = resolve_entities.runelite_id_path(category, Path(resolve_entities.__file__).parent)
+        if id_path is not None and id_path.exists():
+            resolve_entities.load_runelite_ids(id_path)
+    _state["constants"] = validate_java.load_index(root) if validate else None
+
+def convert_guide(guide: Dict[str, Any]) -> Tuple[Dict[str, Any], int, float, Optional[str],
+                                                  List[Dict[str, Any]], List[str]]:
+    """(guide, steps, seconds, error, validation problems, warnings) for one guide."""
+    started = time.perf_counter()
+    # parse_steps/generate_java narrate every guide on stdout, which is dropped;
+    # warnings go to stderr and are handed back so the parent prints them with
+    # their guide instead of interleaving them across workers.
+    warnings = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(warnings):
+            if guide["parsed"] is not None:
+                steps = jsonio.load(guide["parsed"])
+            else:
+                steps = parse_steps.parse_wiki_text(guide["input"].read_text(encoding="latin1"))
+            steps = resolve_entities.resolve_steps(steps, *_state["databases"])
+            generate_java.generate_java(steps, guide["classname"], str(guide["out"]))
+        problems = []
+        if _state["constants"] is not None:
+            problems = validate_java.validate_text(guide["out"].read_text(encoding="utf-8"), _state["constants"])
+    except Exception as e:
+        return guide, 0, time.perf_counter() - started, f"{type(e).__name__}: {e}", [], warnings.getvalue().splitlines()
+    return guide, len(steps), time.perf_counter() - started, None, problems, warnings.getvalue().splitlines()
+
+def run_batch(manifest: Path, world_path: Path, items_path: Path, root: Path, out_dir: Optional[Path] = None,
+              workers: Optional[int] = None, validate: bool = False) -> bool:
+    """Convert every guide in the manifest; returns False if any failed (or failed validation)."""
+    guides = load_manifest(manifest, out_dir)
+    for guide in guides:
+        guide["out"].parent.mkdir(parents=True, exist_ok=True)
+    with profiling.stage("load", [world_path, items_path]):
+        load_state(world_path, items_path, root, validate)
+    workers = min(workers or os.cpu_count() or 1, len(guides)) or 1
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("[WARN] Worker processes cannot inherit the loaded databases on this platform; converting serially.")
+        workers = 1
+    print(f"[batch] Converting {len(guides)} guides with {workers} workers …", flush=True)
+
+    ok = True
+    total_steps = 0
+    started = time.perf_counter()
+    with profiling.stage("convert", outputs=[g["out"] for g in guides]):
+        if workers == 1:
+            results = map(convert_guide, guides)
+            pool = None
+        else:
+            pool = multiprocessing.get_context("fork").Pool(workers)
+            results = pool.imap_unordered(convert_guide, guides)
+        try:
+            for guide, n_steps, seconds, error, problems, warnings in results:
+                for line in warnings:
+                    print(f"[batch] {guide['name']}: {line}", file=sys.stderr)
+                if error is not None:
+                    ok = False
+                    print(f"[ERROR] {guide['name']}: {error}", file=sys.stderr)
+                    continue
+                total_steps += n_steps
+                print(f"[batch] {guide['name']}: {n_steps} steps in {seconds:.2f}s -> {guide['out']}")
+                if problems:
+                    ok = False
+                    validate_java.report(guide["out"], problems)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    elapsed = time.perf_counter() - started
+    profiling.count("guides_converted", len(guides))
+    profiling.count("steps_converted", total_steps)
+    print(f"[batch] {len(guides)} guides, {total_steps} steps in {elapsed:.2f}s "
+          f"({len(guides) / elapsed:.1f} guides/s, {total_steps / elapsed:.0f} steps/s)")
+    return ok
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+bench.py
+Benchmarks for the scraper, cleaner, parser, resolver and generator on
+deterministic synthetic inputs (same seed -> same bytes), at several scales:
+wiki guides with N banks, quest-helper trees with M Java files at a realistic
+WorldPoint/NpcStep/ObjectStep/Zone density, NpcID/ObjectID files with up to
+50k constants, item lists and entity databases.
+
+  python bench.py run --scales small medium --out bench_results.json
+  python bench.py compare bench_baseline.json bench_results.json
+  python bench.py run --baseline bench_baseline.json   # run, then compare
+
+Each case reports the min and median of --repeat timed runs. compare uses
+the min (the least noisy of the two) and flags cases that got slower than
+the baseline by more than --threshold.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import cleanQHDatabase
+import cleanwiki
+import generate_java
+import parse_steps
+import resolve_entities
+import worldpointscraper
+
+SCALES = {
+    "small": dict(banks=20, files=25, ids=5000, entities=500, items=2000, queries=200, points=300, steps=500),
+    "medium": dict(banks=100, files=100, ids=20000, entities=2000, items=10000, queries=500, points=1000, steps=2000),
+    "large": dict(banks=300, files=400, ids=50000, entities=5000, items=30000, queries=1000, points=3000, steps=6000),
+}
+SEED = 1337
+LINES_PER_FILE = 300
+
+# --- synthetic data ---------------------------------------------------------
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 9))).capitalize()
+
+def make_names(rng: random.Random, n: int) -> List[str]:
+    """n distinct three-word names, long enough that a one-letter typo still fuzzy-matches."""
+    names, seen = [], set()
+    while len(names) < n:
+        name = " ".join(make_word(rng) for _ in range(3))
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+def const_name(name: str) -> str:
+    return name.upper().replace(" ", "_")
+
+def typo(rng: random.Random, name: str) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+def random_wp(rng: random.Random) -> Tuple[int, int, int]:
+    return rng.randint(1100, 3900), rng.randint(2500, 10000), rng.choice((0, 0, 0, 1, 2))
+
+def id_file_text(names: List[str], start: int) -> str:
+    return "".join(f"/**\n * {n}\n */\npublic static final int {const_name(n)} = {start + i};\n"
+                   for i, n in enumerate(names))
+
+def java_file_text(rng: random.Random, npc_consts: List[str], obj_consts: List[str], idx: int) -> str:
+    """One helper class with roughly the WorldPoint/step/zone mix of a real quest file."""
+    out = [f"public class Quest{idx} extends BasicQuestHelper {{"]
+    for n in range(LINES_PER_FILE):
+        roll = rng.random()
+        x, y, p = random_wp(rng)
+        if roll < 0.08:
+            out.append(f"    WorldPoint wp{n} = new WorldPoint({x}, {y}, {p});")
+        elif roll < 0.12:
+            out.append(f'    npcStep{n} = new NpcStep(this, NpcID.{rng.choice(npc_consts)}, new WorldPoint({x}, {y}, {p}), "Talk.");')
+        elif roll < 0.15:
+            out.append(f'    objStep{n} = new ObjectStep(this, ObjectID.{rng.choice(obj_consts)}, new WorldPoint({x}, {y}, {p}), "Use.");')
+        elif roll < 0.16:
+            out.append(f"    zone{n} = new Zone(new WorldPoint({x}, {y}, {p}), new WorldPoint({x + 10}, {y + 10}, {p}));")
+        elif roll < 0.17:
+            out.append(f"    WorldPoint region{n} = WorldPoint.fromRegion({x // 64}, {y // 64}, {x % 64}, {y % 64}, {p});")
+        elif roll < 0.23:
+            out.append(f"    talkTo{n}.addAlternateNpcs(NpcID.{rng.choice(npc_consts)});")
+        else:
+            out.append(f"    // step {n}: {make_word(rng)} the {make_word(rng)}")
+            out.append(f"    conditions{n} = new Conditions(LogicType.OR, inZone{n}, hasItem{n});")
+    out.append("}")
+    return "\n".join(out) + "\n"
+
+def wiki_text(rng: random.Random, banks: int, npcs: List[str], items: List[str], objects: List[str]) -> str:
+    """Raw guide wikitext with the bank counter/comment/checklist layout of the real page."""
+    out = ["{{DISPLAYTITLE:Guide:Synthetic Guide}}", "Intro text."]
+    for b in range(1, banks + 1):
+        out.append("{{Var| bankNumber | {{#expr:{{#var:bankNumber}}+1}}}}")
+        out.append(f"<!-- Bank {b} -->")
+        out.append("{{Checklist|title=Bank {{#expr:{{#var:bankNumber}}+1}}|")
+        for _ in range(20):
+            roll = rng.random()
+            if roll < 0.35:
+                out.append(f"* Talk to [[{rng.choice(npcs)}]] ({rng.randint(1, 4)},{rng.randint(1, 4)})")
+            elif roll < 0.6:
+                out.append(f"* Withdraw {rng.randint(1, 28)}x {rng.choice(items)}")
+            elif roll < 0.8:
+                out.append(f"* Use the {rng.choice(items)} on the {rng.choice(objects)}")
+            else:
+                out.append(f"* Kill [[{rng.choice(npcs)}]] and head north")
+        out.append("}}")
+    return "\n".join(out) + "\n"
+
+def enriched_steps(rng: random.Random, n: int, npcs: List[str], items: List[str]) -> List[Dict[str, Any]]:
+    """Steps shaped like resolve_entities output, for the generator."""
+    steps = []
+    for i in range(n):
+        kind = rng.choice(("NpcStep", "ObjectStep", "DetailedQuestStep"))
+        step = {"instruction": f"Step {i}: talk to {rng.choice(npcs)} about the {make_word(rng)}",
+                "type": kind, "panel_name": f"Bank {i // 20 + 1}", "item_matches": []}
+        if kind == "NpcStep":
+            name = rng.choice(npcs)
+            step.update(npc_id_const=const_name(name), npc_id=rng.randint(1, 15000),
+                        worldpoint=[list(random_wp(rng))], dialogue_options=[str(rng.randint(1, 4))])
+        elif kind == "ObjectStep":
+            step.update(object_id_const="OBJECT", object_id=rng.randint(1, 50000), worldpoint=[list(random_wp(rng))])
+            for item in rng.sample(items, rng.randint(1, 3)):
+                step["item_matches"].append({"query": item, "canonical_name": item,
+                                             "item_id": str(rng.randint(1, 30000)), "quantity": rng.randint(1, 5)})
+        steps.append(step)
+    return steps
+
+class Workload:
+    """All synthetic inputs for one scale, written under a temporary directory."""
+
+    def __init__(self, scale: str, root: Path, seed: int = SEED):
+        p = SCALES[scale]
+        rng = random.Random(f"{seed}:{scale}")
+        self.root = root
+        self.npc_names = make_names(rng, p["ids"])
+        self.obj_names = make_names(rng, p["ids"])
+        self.item_names = make_names(rng, p["items"])
+
+        gameval = root / "gameval"
+        gameval.mkdir(parents=True)
+        self.npc_ids = gameval / "NpcID.java"
+        self.obj_ids = gameval / "ObjectID.java"
+        self.npc_ids.write_text(id_file_text(self.npc_names, 1), encoding="utf-8")
+        self.obj_ids.write_text(id_file_text(self.obj_names, 1), encoding="utf-8")
+
+        npc_consts = [const_name(n) for n in self.npc_names[:2000]]
+        obj_consts = [const_name(n) for n in self.obj_names[:2000]]
+        helpers = root / "helpers"
+        self.java_files = []
+        for i in range(p["files"]):
+            jf = helpers / f"q{i % 50:02d}" / f"Quest{i}.java"
+            jf.parent.mkdir(parents=True, exist_ok=True)
+            jf.write_text(java_file_text(rng, npc_consts, obj_consts, i), encoding="utf-8")
+            self.java_files.append(jf)
+
+        entities = self.npc_names[:p["entities"]]
+        world = {"npcs": {const_name(n): {"id": i, "name": n, "worldpoints": [list(random_wp(rng))]}
+                          for i, n in enumerate(entities)}, "objects": {}, "zones": {}}
+        self.world_path = root / "worldpoints.json"
+        self.world_path.write_text(json.dumps(world), encoding="utf-8")
+        self.items_path = root / "items.json"
+        self.items_path.write_text(json.dumps({n: str(i) for i, n in enumerate(self.item_names)}), encoding="utf-8")
+
+        wiki_npcs = entities[:200]
+        self.raw_wiki = wiki_text(rng, p["banks"], wiki_npcs, self.item_names[:300], self.obj_names[:200])
+        self.cleaned_wiki = "\n".join(cleanwiki.clean_lines(self.raw_wiki.splitlines())) + "\n"
+
+        # Mostly exact lookups, one in ten with a typo so the fuzzy path is exercised.
+        self.entity_queries = [typo(rng, n) if rng.random() < 0.1 else n for n in rng.choices(entities, k=p["queries"])]
+        self.item_queries = [{"name": typo(rng, n) if rng.random() < 0.1 else n, "quantity": 1}
+                             for n in rng.choices(self.item_names, k=p["queries"])]
+
+        # A few entities with many nearby points, as NPCs that wander produce.
+        self.point_sets = []
+        for _ in range(5):
+            cx, cy, cp = random_wp(rng)
+            self.point_sets.append([[cx + rng.randint(-40, 40), cy + rng.randint(-40, 40), cp]
+                                    for _ in range(p["points"])])
+
+        self.steps = enriched_steps(rng, p["steps"], entities, self.item_names)
+        self.java_out = root / "Bench.java"
+
+def cases(w: Workload) -> Dict[str, Callable[[], Any]]:
+    idmaps = worldpointscraper.load_id_files(w.npc_ids, w.obj_ids, w.root / "none1", w.root / "none2")
+    npcdict = resolve_entities.load_entities(str(w.world_path), "npcs")
+    itemdict = resolve_entities.load_items(str(w.items_path))
+    return {
+        "load_id_files": lambda: worldpointscraper.load_id_files(w.npc_ids, w.obj_ids, w.root / "none1", w.root / "none2"),
+        "process_file": lambda: [worldpointscraper.process_file((jf, idmaps)) for jf in w.java_files],
+        "deduplicate_worldpoints": lambda: [cleanQHDatabase.deduplicate_worldpoints(ps, threshold=5) for ps in w.point_sets],
+        "clean_lines": lambda: cleanwiki.clean_lines(w.raw_wiki.splitlines()),
+        "parse_wiki_text": lambda: parse_steps.parse_wiki_text(w.cleaned_wiki),
+        "resolve_entity": lambda: [resolve_entities.resolve_entity(q, npcdict, "npcs") for q in w.entity_queries],
+        "resolve_item": lambda: [resolve_entities.resolve_item(q, itemdict) for q in w.item_queries],
+        "generate_java": lambda: generate_java.generate_java(w.steps, "Bench", str(w.java_out)),
+    }
+
+# --- timing -----------------------------------------------------------------
+
+def time_case(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return {"min": round(min(times), 6), "median": round(statistics.median(times), 6), "repeat": repeat}
+
+@contextlib.contextmanager
+def quiet():
+    # The stages print progress and warnings per line; keep that out of the timings' terminal.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+def run(scales: List[str], repeat: int, only: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, float]] = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix=f"bench_{scale}_") as tmp:
+            print(f"[{scale}] generating inputs …", flush=True)
+            with quiet():
+                workload = Workload(scale, Path(tmp))
+                scale_cases = cases(workload)
+            for name, fn in scale_cases.items():
+                if only and name not in only:
+                    continue
+                with quiet():
+                    fn()  # warm-up: imports, regex caches, lru caches
+                    stats = time_case(fn, repeat)
+                key = f"{name}[{scale}]"
+                results[key] = stats
+                print(f"  {key:<32} min {stats['min'] * 1000:9.2f} ms   median {stats['median'] * 1000:9.2f} ms")
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "seed": SEED,
+                 "scales": {s: SCALES[s] for s in scales}, "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, min_delta: float) -> List[str]:
+    """Print a comparison table and return the cases that regressed."""
+    regressions = []
+    base, cur = baseline["results"], current["results"]
+    print(f"\n{'case':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(set(base) & set(cur)):
+        b, c = base[key]["min"], cur[key]["min"]
+        change = (c - b) / b if b else 0.0
+        flag = ""
+        if change > threshold and c - b > min_delta:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif change < -threshold and b - c > min_delta:
+            flag = "  faster"
+        print(f"{key:<32} {b * 1000:10.2f}ms {c * 1000:10.2f}ms {change:+7.1%}{flag}")
+    for key in sorted(set(base) - set(cur)):
+        print(f"{key:<32} (not in current run)")
+    return regressions
+
+def load(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic inputs.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run_ap = sub.add_parser("run", help="Run the benchmarks and write a JSON result file")
+    run_ap.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    run_ap.add_argument("--repeat", type=int, default=5)
+    run_ap.add_argument("--only", nargs="+", default=[], help="Only these cases (e.g. process_file resolve_item)")
+    run_ap.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    run_ap.add_argument("--baseline", type=Path, help="Compare against this result file afterwards")
+
+    cmp_ap = sub.add_parser("compare", help="Compare two result files and flag regressions")
+    cmp_ap.add_argument("baseline", type=Path)
+    cmp_ap.add_argument("current", type=Path)
+
+    for p in (run_ap, cmp_ap):
+        p.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+        p.add_argument("--min-delta", type=float, default=0.002, help="Ignore changes smaller than this many seconds")
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        current = run(args.scales, args.repeat, args.only)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results written to {args.out}")
+        if args.baseline is None:
+            return
+        baseline = load(args.baseline)
+    else:
+        baseline, current = load(args.baseline), load(args.current)
+
+    regressions = compare(baseline, current, args.threshold, args.min_delta)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
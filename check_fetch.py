@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+check_fetch.py
+Checks main.py's fetching against a local stand-in for the wiki, so nothing
+is requested from the real one: conditional requests and the on-disk cache
+(fetch_wikitext), and --pages batches (read_page_list, fetch_many and the
+output name check in run_batch). Prints one line per check and exits 1 if
+any fails.
+
+  python check_fetch.py
+"""
+import http.server
+import json
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+import main as fetcher
+
+GUIDE = "{{DISPLAYTITLE:Guide:Stand-in}}\nintro\n{{Var|bankNumber}}\n<!-- Bank 1 -->\n* Talk to [[Hans]]\n}}\n"
+ETAG = '"v1"'
+
+class StandInWiki(http.server.BaseHTTPRequestHandler):
+    """
+    /w/<title> serves GUIDE with an ETag and answers 304 when it is sent back;
+    /w/Unchanged answers 304 to every request, validators or not.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        page = self.path.split("?", 1)[0]
+        validator = self.headers.get("If-None-Match")
+        self.server.hits.append((page, validator))
+        if page == "/w/Unchanged" or validator == ETAG:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = GUIDE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def check(self, name: str, ok: bool, detail: str = "") -> None:
+        if ok:
+            print(f"[INFO] ok: {name}")
+        else:
+            self.failed += 1
+            print(f"[ERROR] failed: {name}{f' ({detail})' if detail else ''}")
+
+def fetch(url: str, cache_dir: Path) -> Tuple[Optional[str], Optional[Exception]]:
+    try:
+        return fetcher.fetch_wikitext(url, cache_dir), None
+    except Exception as e:
+        return None, e
+
+def run_checks(base: str, hits: List[Tuple[str, Optional[str]]], tmp: Path) -> int:
+    c = Checks()
+    page = f"{base}/w/Guide:Stand-in"
+    cache = tmp / "cache"
+    body_path, meta_path = fetcher.cache_paths(fetcher.raw_url(page), cache)
+
+    text, err = fetch(page, cache)
+    c.check("a first fetch downloads the page and caches it",
+            text == GUIDE and body_path.is_file() and meta_path.is_file(), repr(err))
+
+    hits.clear()
+    text, err = fetch(page, cache)
+    c.check("a repeat fetch revalidates and serves the cached copy on 304",
+            text == GUIDE and hits == [("/w/Guide:Stand-in", ETAG)], f"{err!r}, requests {hits}")
+
+    meta_path.write_text('{"url": "ht', encoding="utf-8")
+    hits.clear()
+    text, err = fetch(page, cache)
+    c.check("a truncated cache entry is a cache miss",
+            text == GUIDE and hits == [("/w/Guide:Stand-in", None)], f"{err!r}, requests {hits}")
+    try:
+        etag = json.loads(meta_path.read_text(encoding="utf-8")).get("etag")
+    except ValueError:
+        etag = None
+    c.check("the refetch rewrites the cache entry", etag == ETAG)
+
+    unchanged = f"{base}/w/Unchanged"
+    text, err = fetch(unchanged, cache)
+    c.check("a 304 to a request without validators is an error",
+            isinstance(err, requests.HTTPError), f"returned {text!r}" if err is None else repr(err))
+    c.check("... and caches nothing", not fetcher.cache_paths(fetcher.raw_url(unchanged), cache)[0].exists())
+
+    page_list = tmp / "pages.txt"
+    other = f"{base}/w/Guide:Other"
+    page_list.write_text(f"{page}\n{page}?action=edit\n# comment\n{other}\n", encoding="utf-8")
+    pages = fetcher.read_page_list(page_list)
+    c.check("read_page_list drops a page listed twice", pages == [page, other], repr(pages))
+
+    hits.clear()
+    fetched = dict(fetcher.fetch_many([page, page, other], workers=4, min_interval=0.0, cache_dir=tmp / "batch"))
+    by_page: Dict[str, int] = {}
+    for path, _ in hits:
+        by_page[path] = by_page.get(path, 0) + 1
+    c.check("fetch_many requests each page once",
+            sorted(fetched) == sorted([page, other]) and by_page == {"/w/Guide:Stand-in": 1, "/w/Guide:Other": 1},
+            f"requests {by_page}")
+
+    hits.clear()
+    try:
+        fetcher.run_batch([f"{base}/w/Guide:A_b", f"{base}/w/Guide:A-b"], None, None, tmp / "out", 2, 0.0)
+        err = None
+    except ValueError as e:
+        err = e
+    c.check("run_batch rejects two pages saved under one name before fetching",
+            err is not None and not hits, f"requests {hits}" if err else "no error")
+
+    return c.failed
+
+def main():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInWiki)
+    server.hits = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            failed = run_checks(f"http://127.0.0.1:{server.server_address[1]}", server.hits, Path(tmp))
+    finally:
+        server.shutdown()
+        server.server_close()
+    if failed:
+        print(f"[ERROR] {failed} check(s) failed")
+        sys.exit(1)
+    print("[INFO] All fetch checks passed.")
+
+if __name__ == "__main__":
+    main()
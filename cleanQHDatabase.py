@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import re
 from pathlib import Path
 
+import jsonio
+import profiling
+
 class CompactListEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, list):
@@ -18,6 +22,8 @@ class CompactListEncoder(json.JSONEncoder):
 
 def post_process_json(file_path):
     """Post-process JSON file to ensure worldpoints arrays are single-line with integer values."""
+    if jsonio.compression(file_path):
+        return  # cosmetic only, and it would need the whole file in memory
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             text = f.read()
@@ -62,71 +68,102 @@ def deduplicate_worldpoints(worldpoints, threshold=5):
     deduplicated = [cluster[0] for cluster in clusters]
     return deduplicated
 
-def clean_database(input_path, cleaned_output_path, ids_output_path):
+def build_lean(data):
+    """Lean database with only npcs, objects, and zones (without mentions)."""
+    lean_data = {
+        'npcs': {},
+        'objects': {},
+        'zones': {}
+    }
+    for key in sorted(data['npcs'].keys()):
+        # Deduplicate worldpoints for NPCs only
+        deduplicated_worldpoints = deduplicate_worldpoints(data['npcs'][key]['worldpoints'], threshold=5)
+        profiling.count("npc_worldpoints_in", len(data['npcs'][key]['worldpoints']))
+        profiling.count("npc_worldpoints_kept", len(deduplicated_worldpoints))
+        lean_data['npcs'][key] = {
+            'id': data['npcs'][key]['id'],
+            'name': data['npcs'][key]['name'],
+            'worldpoints': deduplicated_worldpoints
+        }
+    for key in sorted(data['objects'].keys()):
+        # Keep all worldpoints for objects
+        lean_data['objects'][key] = {
+            'id': data['objects'][key]['id'],
+            'name': data['objects'][key]['name'],
+            'worldpoints': data['objects'][key]['worldpoints']
+        }
+    if 'zones' in data:
+        for zone in sorted(data['zones'], key=lambda z: z['name']):
+            lean_data['zones'][zone['name']] = {
+                'worldpoints': [
+                    [zone['worldpoints'][0]['x'], zone['worldpoints'][0]['y'], zone['worldpoints'][0]['plane']],
+                    [zone['worldpoints'][1]['x'], zone['worldpoints'][1]['y'], zone['worldpoints'][1]['plane']]
+                ]
+            }
+    return lean_data
+
+def write_lean(lean_data, path):
+    jsonio.dump(lean_data, path, indent=2, cls=CompactListEncoder)
+    post_process_json(path)
+
+def write_sorted(data, path):
+    """Write the full database with sorted keys (QH_Cleaned.json)."""
+    # Sort zones by name if present
+    if 'zones' in data:
+        data['zones'] = sorted(data['zones'], key=lambda z: z['name'])
+    
+    # Sort keys for cleaned JSON
+    sorted_data = {key: data[key] for key in sorted(data.keys())}
+    for key in sorted_data:
+        if isinstance(sorted_data[key], dict):
+            sorted_data[key] = {k: sorted_data[key][k] for k in sorted(sorted_data[key].keys())}
+    
+    # Indenting would put every number of the compact mention columns on its own line
+    compact = data.get('format') == 'compact'
+    if compact:
+        jsonio.dump(sorted_data, path, separators=(',', ':'))
+    else:
+        jsonio.dump(sorted_data, path, indent=2, cls=CompactListEncoder)
+    if not compact:
+        post_process_json(path)
+
+def save_lean(lean_data, path, delta=False, patch_path=None):
+    """
+    Write the lean worldpoints.json. With delta, an existing file is patched in
+    place instead of rewritten and the patch is saved to patch_path (see dbdelta.py).
+    """
+    if delta and Path(path).exists():
+        import dbdelta  # dbdelta imports this module for write_lean()
+        patch = dbdelta.update_in_place(path, lean_data, patch_path)
+        print(f"Updated {path} in place: {dbdelta.summary(patch)}")
+        if dbdelta.has_changes(patch):
+            import resolver_daemon
+            if resolver_daemon.send_patch(path, patch_path or dbdelta.default_patch_path(path)):
+                print("Sent the patch to the running resolver daemon")
+    else:
+        write_lean(lean_data, path)
+        print(f"Generated NPC, object, and zone database at {path}")
+
+def clean_database(input_path, cleaned_output_path, ids_output_path, delta=False, patch_path=None):
+    """Write the sorted full database and the lean worldpoints.json (see save_lean)."""
     try:
         # Read the input JSON
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = jsonio.load(input_path)
         
         # Validate input
         if not data:
             print(f"Error: Input file {input_path} is empty or invalid")
             return
         
-        # Sort zones by name if present
-        if 'zones' in data:
-            data['zones'] = sorted(data['zones'], key=lambda z: z['name'])
-        
-        # Sort keys for cleaned JSON
-        sorted_data = {key: data[key] for key in sorted(data.keys())}
-        for key in sorted_data:
-            if isinstance(sorted_data[key], dict):
-                sorted_data[key] = {k: sorted_data[key][k] for k in sorted(sorted_data[key].keys())}
-        
         # Write cleaned JSON with sorted keys and compact worldpoints
         try:
-            with open(cleaned_output_path, 'w', encoding='utf-8') as f:
-                json.dump(sorted_data, f, indent=2, cls=CompactListEncoder)
-            post_process_json(cleaned_output_path)
+            write_sorted(data, cleaned_output_path)
             print(f"Generated cleaned database at {cleaned_output_path}")
         except Exception as e:
             print(f"Error generating {cleaned_output_path}: {e}")
         
-        # Create lean database with only npcs, objects, and zones (without mentions)
-        lean_data = {
-            'npcs': {},
-            'objects': {},
-            'zones': {}
-        }
         try:
-            for key in sorted(data['npcs'].keys()):
-                # Deduplicate worldpoints for NPCs only
-                deduplicated_worldpoints = deduplicate_worldpoints(data['npcs'][key]['worldpoints'], threshold=5)
-                lean_data['npcs'][key] = {
-                    'id': data['npcs'][key]['id'],
-                    'name': data['npcs'][key]['name'],
-                    'worldpoints': deduplicated_worldpoints
-                }
-            for key in sorted(data['objects'].keys()):
-                # Keep all worldpoints for objects
-                lean_data['objects'][key] = {
-                    'id': data['objects'][key]['id'],
-                    'name': data['objects'][key]['name'],
-                    'worldpoints': data['objects'][key]['worldpoints']
-                }
-            if 'zones' in data:
-                for zone in data['zones']:
-                    lean_data['zones'][zone['name']] = {
-                        'worldpoints': [
-                            [zone['worldpoints'][0]['x'], zone['worldpoints'][0]['y'], zone['worldpoints'][0]['plane']],
-                            [zone['worldpoints'][1]['x'], zone['worldpoints'][1]['y'], zone['worldpoints'][1]['plane']]
-                        ]
-                    }
-            
-            with open(ids_output_path, 'w', encoding='utf-8') as f:
-                json.dump(lean_data, f, indent=2, cls=CompactListEncoder)
-            post_process_json(ids_output_path)
-            print(f"Generated NPC, object, and zone database at {ids_output_path}")
+            save_lean(build_lean(data), ids_output_path, delta, patch_path)
         except Exception as e:
             print(f"Error generating {ids_output_path}: {e}")
     
@@ -138,9 +175,24 @@ def main():
     default_input = script_dir / "QH_database.json"
     default_cleaned_output = script_dir / "QH_Cleaned.json"
     default_ids_output = script_dir / "worldpoints.json"
-    
+
+    default_patch = script_dir / "worldpoints.patch.json"
+
+    parser = argparse.ArgumentParser(description="Sort QH_database.json and write the lean worldpoints.json.")
+    parser.add_argument('--delta', action='store_true',
+                        help="Patch the existing worldpoints.json in place and write the changes to --patch")
+    parser.add_argument('--patch', type=Path, default=default_patch)
+    parser.add_argument('--in', dest='input', type=Path, default=default_input,
+                        help="Full database to read (.json, .json.gz or .json.xz)")
+    parser.add_argument('--cleaned', type=Path, default=default_cleaned_output)
+    parser.add_argument('--world', type=Path, default=default_ids_output)
+    profiling.add_arguments(parser, "cleanQHDatabase")
+    args = parser.parse_args()
+    profiling.start("cleanQHDatabase", args.profile, args.profile_dump)
+
     # Corrected function call
-    clean_database(default_input, default_cleaned_output, default_ids_output)
+    with profiling.stage("clean_database", [args.input], [args.cleaned, args.world]):
+        clean_database(args.input, args.cleaned, args.world, args.delta, args.patch)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
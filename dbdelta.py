@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+dbdelta.py
+Patches between two versions of the lean worldpoints.json.
+
+worldpointscraper.py --delta (or cleanQHDatabase.py --delta) diffs a fresh
+scrape against the worldpoints.json on disk, writes the difference to
+worldpoints.patch.json and applies it in place (neither file is touched when
+nothing changed). Consumers that already hold
+the old database (resolver_daemon.py, run_all.py --watch) apply the same patch
+and only redo work for the entities it touches.
+
+Patch format:
+  {"version": 1, "base": sha1 of the file it applies to, "result": sha1 after applying,
+   "npcs": {"added":   {KEY: entry, ...},
+            "removed": {KEY: {"id", "name"}, ...},
+            "changed": {KEY: {"old": {"id", "name"}, "id", "name",
+                              "add": [[x,y,plane], ...], "remove": [...]}}},   # or "worldpoints": [...]
+   "objects": {...}, "zones": {...}}
+Kinds and parts without changes are left out.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+import cleanQHDatabase
+import jsonio
+import profiling
+
+PATCH_VERSION = 1
+KINDS = ("npcs", "objects", "zones")
+
+def default_patch_path(world_path) -> Path:
+    world_path = Path(world_path)
+    return world_path.with_name(Path(jsonio.base_name(world_path)).stem + ".patch.json")
+
+def file_sha1(path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def apply_points(points: List[List[int]], change: Dict[str, Any]) -> List[List[int]]:
+    if "worldpoints" in change:
+        return [list(p) for p in change["worldpoints"]]
+    removed = {tuple(p) for p in change.get("remove", ())}
+    return [list(p) for p in points if tuple(p) not in removed] + [list(p) for p in change.get("add", ())]
+
+def diff_points(old: List[List[int]], new: List[List[int]]) -> Dict[str, Any]:
+    """Points to add and remove, or the whole new list when that would not reproduce it exactly."""
+    old_set = {tuple(p) for p in old}
+    new_set = {tuple(p) for p in new}
+    change: Dict[str, Any] = {}
+    remove = [p for p in old if tuple(p) not in new_set]
+    add = [p for p in new if tuple(p) not in old_set]
+    if remove:
+        change["remove"] = remove
+    if add:
+        change["add"] = add
+    if apply_points(old, change) != new:  # reordered or duplicated points
+        return {"worldpoints": new}
+    return change
+
+def identity(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: entry[k] for k in ("id", "name") if k in entry}
+
+def diff_lean(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    for kind in KINDS:
+        o, n = old.get(kind, {}), new.get(kind, {})
+        part: Dict[str, Any] = {
+            "added": {k: v for k, v in n.items() if k not in o},
+            "removed": {k: identity(v) for k, v in o.items() if k not in n},
+            "changed": {},
+        }
+        for k, v in n.items():
+            if k in o and o[k] != v:
+                part["changed"][k] = {"old": identity(o[k]), **identity(v),
+                                      **diff_points(o[k].get("worldpoints") or [], v.get("worldpoints") or [])}
+        part = {name: entries for name, entries in part.items() if entries}
+        if part:
+            changes[kind] = part
+    return changes
+
+def apply_lean(lean: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Return lean with the patch applied; keys stay sorted as cleanQHDatabase writes them."""
+    result = dict(lean)
+    for kind in KINDS:
+        part = patch.get(kind)
+        if not part:
+            continue
+        section = dict(lean.get(kind, {}))
+        for k in part.get("removed", {}):
+            del section[k]
+        for k, change in part.get("changed", {}).items():
+            entry = identity(change)
+            entry["worldpoints"] = apply_points(section[k].get("worldpoints") or [], change)
+            section[k] = entry
+        section.update(part.get("added", {}))
+        result[kind] = {k: section[k] for k in sorted(section)}
+    return result
+
+def has_changes(patch: Dict[str, Any]) -> bool:
+    return any(patch.get(kind) for kind in KINDS)
+
+def summary(patch: Dict[str, Any]) -> str:
+    if not has_changes(patch):
+        return "no changes"
+    parts = []
+    for kind in KINDS:
+        counts = [f"{len(entries)} {name}" for name, entries in patch.get(kind, {}).items()]
+        if counts:
+            parts.append(f"{kind} {', '.join(counts)}")
+    return "; ".join(parts)
+
+def touched_names(patch: Dict[str, Any], kind: str) -> Set[str]:
+    """Lower-cased names (old and new) of the npcs/objects a patch touches, as resolve_entities keys them."""
+    names = set()
+    part = patch.get(kind, {})
+    for k, e in part.get("added", {}).items():
+        names.add((e.get("name") or k).strip().lower())
+    for k, e in part.get("removed", {}).items():
+        names.add((e.get("name") or k).strip().lower())
+    for k, change in part.get("changed", {}).items():
+        names.add((change.get("old", {}).get("name") or k).strip().lower())
+        names.add((change.get("name") or k).strip().lower())
+    return names
+
+def load_patch(path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        patch = json.load(f)
+    if patch.get("version") != PATCH_VERSION:
+        raise ValueError(f"{path}: unsupported patch version {patch.get('version')!r}")
+    return patch
+
+def write_lean_atomic(lean: Dict[str, Any], path) -> None:
+    tmp = jsonio.tmp_path(path)
+    cleanQHDatabase.write_lean(lean, tmp)
+    os.replace(tmp, path)
+
+def write_patch(patch: Dict[str, Any], path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(patch, f, indent=2)
+
+def update_in_place(world_path, new_lean: Dict[str, Any], patch_path=None) -> Dict[str, Any]:
+    """Diff new_lean against world_path, patch it in place and write the patch next to it."""
+    base = file_sha1(world_path)
+    old = jsonio.load(world_path)
+    new_lean = json.loads(json.dumps(new_lean))  # compare JSON to JSON (tuples vs lists)
+    with profiling.stage("diff"):
+        patch = {"version": PATCH_VERSION, "base": base, "result": base, **diff_lean(old, new_lean)}
+    if has_changes(patch):
+        patched = apply_lean(old, patch)
+        if patched != new_lean:
+            raise ValueError("patch does not reproduce the new database")
+        write_lean_atomic(patched, world_path)
+        patch["result"] = file_sha1(world_path)
+        # An empty patch is not written, so the file keeps describing the last real change.
+        write_patch(patch, patch_path or default_patch_path(world_path))
+    return patch
+
+def apply_patch_file(world_path, patch_path) -> Dict[str, Any]:
+    """Apply a saved patch to the worldpoints.json it was made against."""
+    patch = load_patch(patch_path)
+    current = file_sha1(world_path)
+    if current == patch["result"]:
+        return patch  # already applied
+    if current != patch["base"]:
+        raise ValueError(f"{patch_path} was made against a different {Path(world_path).name}")
+    lean = jsonio.load(world_path)
+    write_lean_atomic(apply_lean(lean, patch), world_path)
+    if file_sha1(world_path) != patch["result"]:
+        print(f"Warning: {world_path} does not match the patch's recorded result", file=sys.stderr)
+    return patch
+
+def main():
+    script_dir = Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Diff or patch the lean worldpoints.json.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("diff", help="Write the patch that turns OLD into NEW")
+    d.add_argument("old", type=Path)
+    d.add_argument("new", type=Path)
+    d.add_argument("--out", type=Path, default=script_dir / "worldpoints.patch.json")
+    a = sub.add_parser("apply", help="Apply a patch to the worldpoints.json it was made against")
+    a.add_argument("patch", type=Path)
+    a.add_argument("--world", type=Path, default=script_dir / "worldpoints.json")
+    profiling.add_arguments(ap, "dbdelta")
+    args = ap.parse_args()
+    profiling.start("dbdelta", args.profile, args.profile_dump)
+
+    try:
+        if args.cmd == "diff":
+            old = jsonio.load(args.old)
+            new = jsonio.load(args.new)
+            with profiling.stage("diff", inputs=[args.old, args.new]):
+                patch = {"version": PATCH_VERSION, "base": file_sha1(args.old),
+                         "result": file_sha1(args.new), **diff_lean(old, new)}
+            write_patch(patch, args.out)
+            print(f"Wrote {args.out}: {summary(patch)}")
+        else:
+            with profiling.stage("apply", inputs=[args.world, args.patch], outputs=[args.world]):
+                patch = apply_patch_file(args.world, args.patch)
+            print(f"Patched {args.world}: {summary(patch)}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,169 +4,243 @@ generate_java.py
 Generates a Runelite QuestHelper Java class from enriched steps JSON.
 Handles ObjectStep for items obtained from objects.
 Uses Path(__file__).parent for output path.
+Each step is turned into a StepRecord once; the class sections are then
+written straight to a buffered file handle in a single pass over the records.
+Identical worldpoints and dialog option arrays are interned into
+private static final constants, and repeated item requirement sets into
+shared array fields, so the generated class does not repeat them per step.
 """
 import json
 import argparse
 import re
+import sys
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, TextIO, Tuple
+
+import jsonio
+import profiling
+
+IMPORTS = [
+    "package com.questhelper.helpers.playerguide;",
+    "",
+    "import net.runelite.api.ItemID;",
+    "import net.runelite.api.NpcID;",
+    "import net.runelite.api.ObjectID;",
+    "import net.runelite.api.coords.WorldPoint;",
+    "import com.questhelper.BasicQuestHelper;",
+    "import com.questhelper.QuestStep;",
+    "import com.questhelper.steps.*;",
+    "import com.questhelper.requirements.*;",
+    "import com.questhelper.requirements.item.ItemRequirement;",
+    "import com.questhelper.requirements.item.ItemRequirements;",
+    "import com.questhelper.panel.PanelDetails;",
+    "import com.questhelper.requirements.util.*;",
+    "import com.questhelper.ItemCollections;",
+    "import java.util.*;"
+]
+
+# Upper bound on the instruction-derived part of a step identifier; long
+# instructions would otherwise produce field names hundreds of characters long.
+MAX_SLUG_LEN = 40
+
+SLUG_STRIP_RE = re.compile(r"[^a-z0-9_]")
+SLUG_UNDERSCORE_RE = re.compile(r"_+")
+
+@dataclass
+class StepRecord:
+    name: str
+    type: str
+    instruction: str
+    panel: str
+    worldpoint: Optional[Tuple[int, int, int]] = None
+    entity_ref: Optional[str] = None
+    comment: Optional[str] = None
+    dialog: Tuple[str, ...] = ()
+    item_vars: Tuple[str, ...] = ()
+
+@dataclass
+class InternedConstants:
+    worldpoints: Dict[Tuple[int, int, int], str] = field(default_factory=dict)
+    dialogs: Dict[Tuple[str, ...], str] = field(default_factory=dict)
+    item_sets: Dict[Tuple[str, ...], str] = field(default_factory=dict)
 
 def const_case(name: str) -> str:
     return re.sub(r"[^A-Z0-9_]", "", name.upper().replace(" ", "_").replace("-", "_").replace("'", ""))
 
-def generate_java(steps: List[Dict[str, Any]], classname: str, out_path: str):
-    imports = [
-        "package com.questhelper.helpers.playerguide;",
-        "",
-        "import net.runelite.api.ItemID;",
-        "import net.runelite.api.NpcID;",
-        "import net.runelite.api.ObjectID;",
-        "import net.runelite.api.coords.WorldPoint;",
-        "import com.questhelper.BasicQuestHelper;",
-        "import com.questhelper.QuestStep;",
-        "import com.questhelper.steps.*;",
-        "import com.questhelper.requirements.*;",
-        "import com.questhelper.requirements.item.ItemRequirement;",
-        "import com.questhelper.requirements.item.ItemRequirements;",
-        "import com.questhelper.panel.PanelDetails;",
-        "import com.questhelper.requirements.util.*;",
-        "import com.questhelper.ItemCollections;",
-        "import java.util.*;"
-    ]
-
-    # Collect unique items for requirements
+def java_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace('"', '\\"')
+
+def item_var_name(canonical: str, quantity: int) -> str:
+    var_name = canonical.lower().replace(" ", "_").replace("'", "")
+    if quantity > 1:
+        var_name += f"_{quantity}x"
+    return var_name
+
+def step_slug(instruction: str) -> str:
+    slug = instruction.lower().replace(" ", "_").replace("[[", "").replace("]]", "").replace("&", "and")
+    slug = SLUG_UNDERSCORE_RE.sub("_", SLUG_STRIP_RE.sub("", slug))
+    return slug[:MAX_SLUG_LEN].strip("_")
+
+def step_identifier(instruction: str, idx: int, taken: set) -> str:
+    """Return a unique, length-bounded Java identifier for a step."""
+    slug = step_slug(instruction)
+    base = f"step_{slug}_{idx}" if slug else f"step_{idx}"
+    name, n = base, 1
+    while name in taken:
+        name = f"{base}_{n}"
+        n += 1
+    taken.add(name)
+    return name
+
+def worldpoint_key(worldpoint) -> Optional[Tuple[int, int, int]]:
+    if not worldpoint:
+        return None
+    x, y, plane = worldpoint[0][:3]
+    return int(x), int(y), int(plane)
+
+def worldpoint_const(key: Tuple[int, int, int]) -> str:
+    return "WP_" + "_".join(str(v).replace("-", "M") for v in key)
+
+def build_records(steps: List[Dict[str, Any]]) -> List[StepRecord]:
+    """Compute everything the emitter needs for each step exactly once."""
+    taken = set()
+    records = []
+    for idx, step in enumerate(steps):
+        step_type = step.get("type", "DetailedQuestStep")
+        rec = StepRecord(
+            name=step_identifier(step["instruction"], idx, taken),
+            type=step_type,
+            instruction=java_string(step["instruction"]),
+            panel=step.get("panel_name", "General"),
+        )
+        if step_type == "NpcStep":
+            rec.entity_ref = f"NpcID.{step.get('npc_id_const', 'UNKNOWN')}_{step.get('npc_id', '0')}"
+            rec.worldpoint = worldpoint_key(step.get("worldpoint"))
+            rec.comment = step.get("comment")
+            rec.dialog = tuple(java_string(str(d)) for d in step.get("dialogue_options") or [])
+        elif step_type == "ObjectStep":
+            rec.entity_ref = f"ObjectID.{step.get('object_id_const', 'UNKNOWN')}_{step.get('object_id', '0')}"
+            rec.worldpoint = worldpoint_key(step.get("worldpoint"))
+            rec.comment = step.get("comment")
+            rec.item_vars = tuple(item_var_name(m["canonical_name"], m["quantity"]) for m in step.get("item_matches", []))
+        records.append(rec)
+    return records
+
+def intern_constants(records: List[StepRecord]) -> InternedConstants:
+    """Assign one shared name to every distinct worldpoint, dialog array and item set."""
+    interned = InternedConstants()
+    for rec in records:
+        if rec.worldpoint is not None and rec.worldpoint not in interned.worldpoints:
+            interned.worldpoints[rec.worldpoint] = worldpoint_const(rec.worldpoint)
+        if rec.dialog and rec.dialog not in interned.dialogs:
+            interned.dialogs[rec.dialog] = f"DIALOG_{len(interned.dialogs)}"
+        # A single requirement is already a shared field; only sets need one.
+        if len(rec.item_vars) > 1 and rec.item_vars not in interned.item_sets:
+            interned.item_sets[rec.item_vars] = f"itemSet{len(interned.item_sets)}"
+    return interned
+
+def collect_items(steps: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
     items = {}
     for step in steps:
         for item in step.get("item_matches", []):
-            canonical = item["canonical_name"]
-            item_id = item["item_id"]
-            quantity = item["quantity"]
-            var_name = canonical.lower().replace(" ", "_").replace("'", "")
-            if quantity > 1:
-                var_name += f"_{quantity}x"
-            items[var_name] = {"name": canonical, "id": item_id, "quantity": quantity}
+            var_name = item_var_name(item["canonical_name"], item["quantity"])
+            items[var_name] = {"name": item["canonical_name"], "id": item["item_id"], "quantity": item["quantity"]}
+    return items
+
+def write_class(f: TextIO, records: List[StepRecord], items: Dict[str, Dict[str, Any]],
+                interned: InternedConstants, classname: str) -> None:
+    w = f.write
+    w("\n".join(IMPORTS))
+    w(f"\n\npublic class {classname} extends BasicQuestHelper {{")
 
-    # Generate class
-    class_lines = [f"public class {classname} extends BasicQuestHelper {{"]
+    # Shared constants
+    if interned.worldpoints or interned.dialogs:
+        w("\n    // Shared Constants")
+        for (x, y, plane), const in interned.worldpoints.items():
+            w(f"\n    private static final WorldPoint {const} = new WorldPoint({x}, {y}, {plane});")
+        for dialog, const in interned.dialogs.items():
+            options = ", ".join(f"\"{d}\"" for d in dialog)
+            w(f"\n    private static final String[] {const} = {{{options}}};")
+        w("\n")
 
     # Item requirements
-    class_lines.append("    // Item Requirements")
-    for var_name, item in items.items():
-        class_lines.append(f"    ItemRequirement {var_name};")
+    w("\n    // Item Requirements")
+    for var_name in items:
+        w(f"\n    ItemRequirement {var_name};")
+    for set_name in interned.item_sets.values():
+        w(f"\n    ItemRequirement[] {set_name};")
 
     # Step fields
-    class_lines.append("\n    // Step Fields")
-    for idx, step in enumerate(steps):
-        step_name = step["instruction"].lower().replace(" ", "_").replace("[[", "").replace("]]", "").replace("(", "").replace(")", "").replace("&", "and")
-        step_name = re.sub(r"[^a-z0-9_]", "", step_name)
-        step_name = f"step_{step_name}_{idx}"
-        class_lines.append(f"    QuestStep {step_name};")
+    w("\n\n    // Step Fields")
+    for rec in records:
+        w(f"\n    QuestStep {rec.name};")
 
     # setupRequirements
-    class_lines.append("\n    @Override")
-    class_lines.append("    public void setupRequirements()")
-    class_lines.append("    {")
+    w("\n\n    @Override\n    public void setupRequirements()\n    {")
     for var_name, item in items.items():
-        if item["id"].startswith("ItemCollections."):
-            class_lines.append(f"        {var_name} = new ItemRequirement(\"{item['name']}\", {item['id']}, {item['quantity']});")
-        else:
-            class_lines.append(f"        {var_name} = new ItemRequirement(\"{item['name']}\", ItemID.{const_case(item['name'])}, {item['quantity']});")
-    class_lines.append("    }")
+        item_ref = item["id"] if item["id"].startswith("ItemCollections.") else f"ItemID.{const_case(item['name'])}"
+        w(f"\n        {var_name} = new ItemRequirement(\"{java_string(item['name'])}\", {item_ref}, {item['quantity']});")
+    for item_vars, set_name in interned.item_sets.items():
+        w(f"\n        {set_name} = new ItemRequirement[]{{{', '.join(item_vars)}}};")
+    w("\n    }")
 
     # setupSteps
-    class_lines.append("\n    @Override")
-    class_lines.append("    public void setupSteps()")
-    class_lines.append("    {")
-    for idx, step in enumerate(steps):
-        step_name = step["instruction"].lower().replace(" ", "_").replace("[[", "").replace("]]", "").replace("(", "").replace(")", "").replace("&", "and")
-        step_name = re.sub(r"[^a-z0-9_]", "", step_name)
-        step_name = f"step_{step_name}_{idx}"
-        step_type = step.get("type", "DetailedQuestStep")
-        instruction = step["instruction"].replace('"', '\\"')
-
-        if step_type == "NpcStep":
-            npc_id = step.get("npc_id", "0")
-            npc_const = step.get("npc_id_const", "UNKNOWN")
-            worldpoint = step.get("worldpoint", None)
-            comment = step.get("comment", None)
-            if comment:
-                class_lines.append(f"        // {comment}")
-            wp_str = "null" if worldpoint is None else f"new WorldPoint({worldpoint[0][0]}, {worldpoint[0][1]}, {worldpoint[0][2]})"
-            class_lines.append(f"        {step_name} = new NpcStep(this, NpcID.{npc_const}_{npc_id}, {wp_str}, \"{instruction}\");")
-            if step.get("dialogue_options"):
-                dialog = ", ".join(f"\"{d}\"" for d in step["dialogue_options"])
-                class_lines.append(f"        {step_name}.addDialogSteps({dialog});")
-        elif step_type == "ObjectStep":
-            obj_id = step.get("object_id", "0")
-            obj_const = step.get("object_id_const", "UNKNOWN")
-            worldpoint = step.get("worldpoint", None)
-            comment = step.get("comment", None)
-            if comment:
-                class_lines.append(f"        // {comment}")
-            wp_str = "null" if worldpoint is None else f"new WorldPoint({worldpoint[0][0]}, {worldpoint[0][1]}, {worldpoint[0][2]})"
-            class_lines.append(f"        {step_name} = new ObjectStep(this, ObjectID.{obj_const}_{obj_id}, {wp_str}, \"{instruction}\");")
-            # Add item requirements for ObjectStep
-            for item in step.get("item_matches", []):
-                var_name = item["canonical_name"].lower().replace(" ", "_").replace("'", "")
-                if item["quantity"] > 1:
-                    var_name += f"_{item['quantity']}x"
-                class_lines.append(f"        {step_name}.addItemRequirements({var_name});")
+    w("\n\n    @Override\n    public void setupSteps()\n    {")
+    for rec in records:
+        if rec.comment:
+            w(f"\n        // {rec.comment}")
+        wp = "null" if rec.worldpoint is None else interned.worldpoints[rec.worldpoint]
+        if rec.type == "NpcStep":
+            w(f"\n        {rec.name} = new NpcStep(this, {rec.entity_ref}, {wp}, \"{rec.instruction}\");")
+            if rec.dialog:
+                w(f"\n        {rec.name}.addDialogSteps({interned.dialogs[rec.dialog]});")
+        elif rec.type == "ObjectStep":
+            w(f"\n        {rec.name} = new ObjectStep(this, {rec.entity_ref}, {wp}, \"{rec.instruction}\");")
+            if rec.item_vars in interned.item_sets:
+                w(f"\n        {rec.name}.addItemRequirements({interned.item_sets[rec.item_vars]});")
+            elif rec.item_vars:
+                w(f"\n        {rec.name}.addItemRequirements({rec.item_vars[0]});")
         else:
-            class_lines.append(f"        {step_name} = new DetailedQuestStep(this, \"{instruction}\");")
-    class_lines.append("    }")
+            w(f"\n        {rec.name} = new DetailedQuestStep(this, \"{rec.instruction}\");")
+    w("\n    }")
 
     # loadSteps
-    class_lines.append("\n    @Override")
-    class_lines.append("    public Map<Integer, QuestStep> loadSteps()")
-    class_lines.append("    {")
-    class_lines.append("        Map<Integer, QuestStep> steps = new HashMap<>();")
-    class_lines.append("        int idx = 0;")
-    for idx, step in enumerate(steps):
-        step_name = step["instruction"].lower().replace(" ", "_").replace("[[", "").replace("]]", "").replace("(", "").replace(")", "").replace("&", "and")
-        step_name = re.sub(r"[^a-z0-9_]", "", step_name)
-        step_name = f"step_{step_name}_{idx}"
-        class_lines.append(f"        steps.put(idx++, {step_name});")
-    class_lines.append("        return steps;")
-    class_lines.append("    }")
+    w("\n\n    @Override\n    public Map<Integer, QuestStep> loadSteps()\n    {")
+    w("\n        Map<Integer, QuestStep> steps = new HashMap<>();")
+    w("\n        int idx = 0;")
+    for rec in records:
+        w(f"\n        steps.put(idx++, {rec.name});")
+    w("\n        return steps;\n    }")
 
     # getPanels
-    class_lines.append("\n    @Override")
-    class_lines.append("    public List<PanelDetails> getPanels()")
-    class_lines.append("    {")
-    class_lines.append("        List<PanelDetails> panels = new ArrayList<>();")
-    panels = {}
-    for idx, step in enumerate(steps):
-        panel_name = step.get("panel_name", "General")
-        step_name = step["instruction"].lower().replace(" ", "_").replace("[[", "").replace("]]", "").replace("(", "").replace(")", "").replace("&", "and")
-        step_name = re.sub(r"[^a-z0-9_]", "", step_name)
-        step_name = f"step_{step_name}_{idx}"
-        if panel_name not in panels:
-            panels[panel_name] = []
-        panels[panel_name].append(step_name)
+    w("\n\n    @Override\n    public List<PanelDetails> getPanels()\n    {")
+    w("\n        List<PanelDetails> panels = new ArrayList<>();")
+    panels: Dict[str, List[str]] = {}
+    for rec in records:
+        panels.setdefault(rec.panel, []).append(rec.name)
     for panel_name, step_names in panels.items():
-        step_list = ", ".join(step_names)
-        class_lines.append(f"        PanelDetails panel_{panel_name.lower().replace(' ', '_')} = new PanelDetails(\"{panel_name}\", Arrays.asList({step_list}));")
-        class_lines.append(f"        panels.add(panel_{panel_name.lower().replace(' ', '_')});")
-    class_lines.append("        return panels;")
-    class_lines.append("    }")
+        panel_var = f"panel_{panel_name.lower().replace(' ', '_')}"
+        w(f"\n        PanelDetails {panel_var} = new PanelDetails(\"{java_string(panel_name)}\", Arrays.asList({', '.join(step_names)}));")
+        w(f"\n        panels.add({panel_var});")
+    w("\n        return panels;\n    }")
 
     # Empty setupZones and setupConditions
-    class_lines.append("\n    @Override")
-    class_lines.append("    public void setupZones()")
-    class_lines.append("    {")
-    class_lines.append("        // Define zones if needed")
-    class_lines.append("    }")
-    class_lines.append("\n    @Override")
-    class_lines.append("    public void setupConditions()")
-    class_lines.append("    {")
-    class_lines.append("        // Define conditions if needed")
-    class_lines.append("    }")
-    class_lines.append("}")
-
-    # Write to file
+    w("\n\n    @Override\n    public void setupZones()\n    {\n        // Define zones if needed\n    }")
+    w("\n\n    @Override\n    public void setupConditions()\n    {\n        // Define conditions if needed\n    }")
+    w("\n}")
+
+def generate_java(steps: List[Dict[str, Any]], classname: str, out_path: str):
+    records = build_records(steps)
+    items = collect_items(steps)
+    interned = intern_constants(records)
+
     out_path = Path(out_path)
-    with out_path.open("w", encoding="utf-8") as f:
-        f.write("\n".join(imports + [""] + class_lines))
+    with out_path.open("w", encoding="utf-8", buffering=1 << 16) as f:
+        write_class(f, records, items, interned, classname)
+    profiling.count("steps_emitted", len(records))
+    profiling.count("constants_interned",
+                    len(interned.worldpoints) + len(interned.dialogs) + len(interned.item_sets))
     print(f"Wrote Java to {out_path}")
 
 def main():
@@ -174,12 +248,15 @@ def main():
     ap.add_argument("--in", required=True, dest="input")
     ap.add_argument("--classname", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--validate", action="store_true",
+                    help="Check the NpcID/ObjectID/ItemID references against the RuneLite sources; exit 1 on unknown ones")
+    profiling.add_arguments(ap, "generate_java")
     args = ap.parse_args()
+    profiling.start("generate_java", args.profile, args.profile_dump)
 
     input_path = Path(args.input)
     try:
-        with input_path.open("r", encoding="utf-8") as f:
-            steps = json.load(f)
+        steps = jsonio.load(input_path)
     except json.JSONDecodeError as e:
         print(f"Error: Failed to parse {input_path}: {e}", file=sys.stderr)
         raise
@@ -187,7 +264,15 @@ def main():
         print(f"Error: {input_path} not found", file=sys.stderr)
         raise
 
-    generate_java(steps, args.classname, args.out)
+    with profiling.stage("generate_java", [input_path], [args.out]):
+        generate_java(steps, args.classname, args.out)
+
+    if args.validate:
+        import validate_java
+        with profiling.stage("validate", [args.out]):
+            ok = validate_java.report(args.out, validate_java.validate_file(Path(args.out)))
+        if not ok:
+            sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
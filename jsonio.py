@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+jsonio.py
+Reads and writes the pipeline's JSON artifacts by file extension:
+name.json is plain text, name.json.gz and name.json.xz are gzip/xz
+compressed. Compressed files are streamed through the (de)compressor, so
+only the decompressed text is ever held in memory, never both forms.
+gzip files are written without a timestamp, so rewriting the same data
+gives the same bytes (stages.py and dbdelta.py compare file hashes).
+"""
+import gzip
+import io
+import json
+import lzma
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".xz": "xz"}
+
+def compression(path) -> Optional[str]:
+    """'gzip', 'xz' or None for a plain file."""
+    return COMPRESSED_SUFFIXES.get(Path(path).suffix.lower())
+
+def base_name(path) -> str:
+    """File name without the compression suffix (worldpoints.json.gz -> worldpoints.json)."""
+    path = Path(path)
+    return path.stem if compression(path) else path.name
+
+def tmp_path(path) -> Path:
+    """Temporary name next to path that is written with the same compression."""
+    path = Path(path)
+    return path.with_name(f"{base_name(path)}.tmp{path.suffix if compression(path) else ''}")
+
+class _OwningGzipFile(gzip.GzipFile):
+    """GzipFile over a file object it opened itself, closing that file too."""
+
+    def __init__(self, raw, **kwargs):
+        self._raw = raw
+        super().__init__(fileobj=raw, **kwargs)
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+def open_text(path, mode: str = "r", encoding: str = "utf-8", errors: Optional[str] = None) -> TextIO:
+    """Open a text stream on a plain or compressed file; mode is 'r' or 'w'."""
+    kind = compression(path)
+    if kind == "gzip":
+        if mode == "w":
+            # No file name or timestamp in the header: a file written under a
+            # temporary name and renamed matches one written in place.
+            raw = open(path, "wb")
+            try:
+                binary = _OwningGzipFile(raw, filename="", mode="wb", mtime=0)
+            except BaseException:
+                raw.close()
+                raise
+        else:
+            binary = gzip.open(path, "rb")
+        return io.TextIOWrapper(binary, encoding=encoding, errors=errors)
+    if kind == "xz":
+        return lzma.open(path, mode + "t", encoding=encoding, errors=errors)
+    return open(path, mode, encoding=encoding, errors=errors)
+
+def load(path, errors: Optional[str] = None) -> Any:
+    with open_text(path, "r", errors=errors) as f:
+        return json.load(f)
+
+def dump(obj: Any, path, **kwargs) -> None:
+    """json.dump obj to path; kwargs are passed to json.dump."""
+    with open_text(path, "w") as f:
+        json.dump(obj, f, **kwargs)
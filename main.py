@@ -1,25 +1,35 @@
-import html
+import argparse
+import hashlib
+import json
 import os
 import re
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import profiling
+from cleanwiki import write_clean_tokens
+from shards import run_sharded
+from stages import STAGES, run_stages
+from wikitext import Guide, parse_guide, select_tokens
 
 URL = (
     "https://oldschool.runescape.wiki/w/Guide:"
     "B0aty_HCIM_Guide_V3?action=edit"
 )
 OUTPUT_FILE = "wiki.txt"
-
-FOLLOW_UP_SCRIPTS = [
-    "cleanwiki.py",
-    "worldpointscraper.py",
-    "cleanQHDatabase.py",
-    "run_all.py",
-]
+CLEANED_FILE = "wiki_cleaned.txt"
+CACHE_DIR = Path(__file__).resolve().parent / ".wiki_cache"
+WIKI_BASE = "https://oldschool.runescape.wiki/w/"
 
 
 def prompt_range() -> Tuple[Optional[int], Optional[int]]:
@@ -39,18 +49,164 @@ def prompt_range() -> Tuple[Optional[int], Optional[int]]:
         print("  Invalid input. Use 'all' or N-M with N ≤ M (example: 3-8).")
 
 
-def fetch_wikitext(url: str) -> str:
-    page = requests.get(url, timeout=30)
-    page.raise_for_status()
-
-    match = re.search(r"<textarea[^>]*>(.*?)</textarea>", page.text, re.DOTALL)
-    if not match:
-        raise RuntimeError("Could not locate <textarea> with wikitext.")
-
-    return html.unescape(match.group(1))
-
-
-BANK_COMMENT_RE = re.compile(r"<!--\s*Bank\s*(\d+)\s*-->", re.IGNORECASE)
+def raw_url(url: str) -> str:
+    """Turn a wiki page URL (plain or ?action=edit) into its ?action=raw form."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "action"]
+    query.append(("action", "raw"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def cache_paths(url: str, cache_dir: Path) -> Tuple[Path, Path]:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return cache_dir / f"{key}.wiki", cache_dir / f"{key}.json"
+
+
+class HostRateLimiter:
+    """Keeps requests to the same host at least min_interval seconds apart."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._hosts: dict[str, list] = {}
+
+    def wait(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._hosts.setdefault(host, [threading.Lock(), 0.0])
+        with slot[0]:
+            delay = slot[1] + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            slot[1] = time.monotonic()
+
+
+def make_session(pool_size: int = 8, retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """Keep-alive session with a connection pool and retry/backoff on transient errors."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_wikitext(
+    url: str,
+    cache_dir: Path = CACHE_DIR,
+    session: Optional[requests.Session] = None,
+    limiter: Optional[HostRateLimiter] = None,
+) -> str:
+    """
+    Fetch a page's raw wikitext, revalidating a local copy with
+    If-None-Match/If-Modified-Since. A 304 returns the cached text; a 2xx is
+    streamed to the cache file before being read back. An unreadable cache
+    entry is fetched again.
+    """
+    src = raw_url(url)
+    body_path, meta_path = cache_paths(src, cache_dir)
+
+    headers = {}
+    if body_path.is_file() and meta_path.is_file():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = None
+        if not isinstance(meta, dict):
+            print(f"[WARN] Cache entry {meta_path} is corrupt; fetching {src} again.")
+            meta = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    if limiter is not None:
+        limiter.wait(src)
+    getter = session.get if session is not None else requests.get
+    with getter(src, headers=headers, timeout=30, stream=True) as resp:
+        if resp.status_code == 304 and headers:
+            print(f"[INFO] {src} not modified; using cached copy.")
+            profiling.count("fetch_cache_hits")
+            return body_path.read_text(encoding="utf-8")
+        resp.raise_for_status()
+        if not 200 <= resp.status_code < 300:
+            # raise_for_status() lets 3xx through, e.g. a 304 to a request without validators.
+            raise requests.HTTPError(f"Unexpected {resp.status_code} {resp.reason} for url: {src}", response=resp)
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = body_path.with_suffix(".part")
+        with open(tmp_path, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=1 << 16):
+                f.write(chunk)
+                profiling.count("bytes_downloaded", len(chunk))
+        profiling.count("pages_downloaded")
+        os.replace(tmp_path, body_path)
+        meta_path.write_text(json.dumps({
+            "url": src,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }), encoding="utf-8")
+
+    return body_path.read_text(encoding="utf-8")
+
+
+def page_url(page: str) -> str:
+    """Accept either a full URL or a wiki page title such as 'Guide:Foo/Bar'."""
+    if page.startswith(("http://", "https://")):
+        return page
+    return WIKI_BASE + page.strip().replace(" ", "_")
+
+
+def page_slug(url: str) -> str:
+    title = unquote(urlsplit(url).path.rsplit("/w/", 1)[-1])
+    return re.sub(r"[^A-Za-z0-9]+", "_", title).strip("_") or "page"
+
+
+def fetch_many(
+    urls: Iterable[str],
+    workers: int = 4,
+    min_interval: float = 1.0,
+    cache_dir: Path = CACHE_DIR,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Fetch several pages concurrently over one pooled session and yield
+    (url, wikitext) pairs in completion order. Failed pages are reported and
+    skipped so one bad page does not stop the batch.
+    """
+    # The same page twice would race on one cache body and .part file.
+    unique: dict[str, str] = {}
+    for u in urls:
+        unique.setdefault(raw_url(u), u)
+    limiter = HostRateLimiter(min_interval)
+    with make_session(pool_size=workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_wikitext, u, cache_dir, session, limiter): u for u in unique.values()}
+        for fut in as_completed(futures):
+            url = futures[fut]
+            try:
+                yield url, fut.result()
+            except Exception as exc:
+                print(f"[ERROR] {url}: {exc}", file=sys.stderr)
+
+
+def read_page_list(path: Path) -> list[str]:
+    """Page URLs listed in path, without repeats of a page already listed."""
+    pages, seen = [], set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            url = page_url(line)
+            if raw_url(url) in seen:
+                print(f"[WARN] {line} is listed more than once; fetching it once.")
+                continue
+            seen.add(raw_url(url))
+            pages.append(url)
+    return pages
 
 
 def strip_trailing_braces(lines: list[str]) -> list[str]:
@@ -65,39 +221,53 @@ def keep_block(bank_no: int, lo: Optional[int], hi: Optional[int]) -> bool:
     return lo <= bank_no <= hi
 
 
-def extract_bank_blocks(text: str, lo: Optional[int], hi: Optional[int]) -> list[str]:
+def build_bank_index(text: str) -> dict:
+    """Bank offsets of the guide (see wikitext.parse_guide), in cacheable form."""
+    return parse_guide(text).index()
 
-    lines = text.splitlines()
 
-    try:
-        start = lines.index("{{DISPLAYTITLE:Guide:B0aty HCIM Guide V3}}")
-    except ValueError:
-        raise RuntimeError("DISPLAYTITLE line not found.")
-    lines = lines[start:]
+def load_bank_index(text: str, cache_path: Optional[Path] = None) -> dict:
+    """Return the bank index for text, reusing cache_path when it matches the text's hash."""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    if cache_path is not None and cache_path.is_file():
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+            if cached.get("sha1") == digest:
+                profiling.count("bank_index_cache_hits")
+                return cached["index"]
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+    index = build_bank_index(text)
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"sha1": digest, "index": index}), encoding="utf-8")
+    return index
+
 
+def bank_block(text: str, index: dict, bank_no: int) -> list[str]:
+    """Lines of every {{Var block tagged with the given bank number."""
     out: list[str] = []
-    i, n = 0, len(lines)
-
-    while i < n:
-        if lines[i].lstrip().startswith("{{Var"):
-            block: list[str] = [lines[i]]
-            i += 1
-            while i < n and not lines[i].lstrip().startswith("{{Var"):
-                block.append(lines[i])
-                i += 1
-
-            bank_no = None
-            for ln in block:
-                m = BANK_COMMENT_RE.search(ln)
-                if m:
-                    bank_no = int(m.group(1))
-                    break
-
-            if bank_no is not None and keep_block(bank_no, lo, hi):
-                out.extend(strip_trailing_braces(block))
-        else:
-            out.append(lines[i])
-            i += 1
+    for bank in Guide.from_index(text, index).bank(bank_no):
+        out.extend(bank.text.splitlines())
+    return out
+
+
+def extract_bank_blocks(
+    text: str,
+    lo: Optional[int],
+    hi: Optional[int],
+    index: Optional[dict] = None,
+) -> list[str]:
+
+    if index is None:
+        index = build_bank_index(text)
+
+    out: list[str] = text[index["start"]:index["preamble_end"]].splitlines()
+
+    for bank_no, begin, end in index["blocks"]:
+        if bank_no is not None and keep_block(bank_no, lo, hi):
+            out.extend(strip_trailing_braces(text[begin:end].splitlines()))
 
     if not out or out[-1].strip() != "}}":
         out.append("}}")
@@ -105,42 +275,105 @@ def extract_bank_blocks(text: str, lo: Optional[int], hi: Optional[int]) -> list
     return out
 
 
-def run_follow_up_scripts(script_dir: Path) -> None:
-
-    python_exe = sys.executable
-
-    for script_name in FOLLOW_UP_SCRIPTS:
-        script_path = script_dir / script_name
-        if not script_path.is_file():
-            print(f"[WARN] {script_name} not found; skipping.")
+def run_batch(pages: list[str], lo: Optional[int], hi: Optional[int],
+              out_dir: Path, workers: int, min_interval: float) -> int:
+    """Fetch pages concurrently and save each one's selected banks as it arrives."""
+    slugs: dict[str, str] = {}
+    for url in pages:
+        other = slugs.setdefault(page_slug(url), url)
+        if other != url:
+            raise ValueError(f"{other} and {url} would both be saved as '{page_slug(url)}.txt'")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    saved = 0
+    for url, raw in fetch_many(pages, workers=workers, min_interval=min_interval):
+        try:
+            lines = extract_bank_blocks(raw, lo, hi)
+        except RuntimeError as exc:
+            print(f"[ERROR] {url}: {exc}", file=sys.stderr)
             continue
-
-        print(f"[INFO] Running {script_name} …")
-        subprocess.run(
-            [python_exe, str(script_path)],
-            cwd=script_dir,
-            check=True,
-        )
+        dest = out_dir / f"{page_slug(url)}.txt"
+        with open(dest, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        saved += 1
+        print(f"[INFO] Saved {url} -> '{dest}'.")
+    return saved
 
 
 def main() -> None:
+    ap = argparse.ArgumentParser(description="Fetch the guide and run the conversion pipeline.")
+    ap.add_argument("--force", action="store_true",
+                    help="Re-run every follow-up script even if its inputs are unchanged")
+    ap.add_argument("--sharded", action="store_true",
+                    help="Process each bank as its own shard under shards/ and merge them")
+    ap.add_argument("--save-raw", action="store_true",
+                    help=f"Write the selected wikitext to {OUTPUT_FILE} and clean it with cleanwiki.py "
+                         f"instead of piping it straight into {CLEANED_FILE}")
+    ap.add_argument("--pages", type=Path,
+                    help="Batch mode: file with one guide URL or page title per line")
+    ap.add_argument("--out-dir", type=Path, default=Path("guides"),
+                    help="Batch mode: where to save each page's selected banks")
+    ap.add_argument("--workers", type=int, default=4, help="Batch mode: concurrent fetches")
+    ap.add_argument("--rate", type=float, default=1.0,
+                    help="Batch mode: minimum seconds between requests to the same host")
+    profiling.add_arguments(ap, "main")
+    args = ap.parse_args()
+    profiling.start("main", args.profile, args.profile_dump)
+
     lo, hi = prompt_range()
 
+    if args.pages:
+        pages = read_page_list(args.pages)
+        try:
+            with profiling.stage("batch", [args.pages], [args.out_dir]):
+                saved = run_batch(pages, lo, hi, args.out_dir, args.workers, args.rate)
+        except ValueError as exc:
+            print(f"[ERROR] {exc}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\n[INFO] Saved {saved}/{len(pages)} pages to '{args.out_dir}'.")
+        sys.exit(0 if saved == len(pages) else 1)
+
     try:
-        raw = fetch_wikitext(URL)
-        lines = extract_bank_blocks(raw, lo, hi)
+        body_path, _ = cache_paths(raw_url(URL), CACHE_DIR)
+        with profiling.stage("fetch", outputs=[body_path]):
+            raw = fetch_wikitext(URL)
+        with profiling.stage("bank_index"):
+            index = load_bank_index(raw, body_path.with_suffix(".idx.json"))
     except Exception as exc:
         print(f"Error: {exc}", file=sys.stderr)
         sys.exit(1)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
+    here = Path(__file__).resolve().parent
 
-    print(f"[INFO] Saved selected Bank sections to '{OUTPUT_FILE}'.\n")
+    if args.sharded:
+        # Only the database branch runs as scripts; the wiki side is per shard.
+        db_stages = [s for s in STAGES if s.name == "worldpointscraper"]
+        try:
+            run_stages(here, db_stages, force=args.force)
+            with profiling.stage("sharded", outputs=[here / "QuestFromWiki.java"]):
+                run_sharded(raw, index, lo, hi, here, here / "QuestFromWiki.java")
+        except (subprocess.CalledProcessError, FileNotFoundError) as exc:
+            print(f"[ERROR] {exc}", file=sys.stderr)
+            sys.exit(1)
+        print("\n[INFO] Sharded conversion completed successfully.")
+        return
+
+    if args.save_raw:
+        with profiling.stage("extract", outputs=[OUTPUT_FILE]):
+            lines = extract_bank_blocks(raw, lo, hi, index)
+            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+        print(f"[INFO] Saved selected Bank sections to '{OUTPUT_FILE}'.\n")
+        skip = ()
+    else:
+        # Feed the selected banks' tokens straight to the cleaner.
+        with profiling.stage("cleanwiki", outputs=[here / CLEANED_FILE]):
+            guide = Guide.from_index(raw, index)
+            count = write_clean_tokens(select_tokens(guide, lo, hi), here / CLEANED_FILE)
+        print(f"[INFO] Cleaned {count} lines into '{CLEANED_FILE}'.\n")
+        skip = ("cleanwiki",)
 
-    here = Path(__file__).resolve().parent
     try:
-        run_follow_up_scripts(here)
+        run_stages(here, force=args.force, skip=skip)
     except subprocess.CalledProcessError as exc:
         print(f"[ERROR] {exc} (exit code {exc.returncode})", file=sys.stderr)
         sys.exit(exc.returncode)
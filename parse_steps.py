@@ -8,23 +8,35 @@ Enhanced [DEBUG] logging to diagnose early failures.
 Uses latin1 encoding to avoid chardet dependency.
 """
 import re
-import json
 import argparse
 import sys
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any
 from pathlib import Path
 
+import jsonio
+import profiling
+from wikitext import Token, iter_tokens
+
+ITEM_RE = re.compile(r"\[\[([^\]\|]+)(?:\|[^\]]*)?\]\](?:\((\d+)\))?|(\d+x)\s+([^\[\]\(\),;&]+(?:\s+[^\[\]\(\),;&]+)*)|([^\[\]\(\),;&]+(?:\s+[^\[\]\(\),;&]+)*)\s+(?:on|off|in|at)\s+(?:the|a)\s+([^\[\]\(\),;&]+)")
+
 def parse_wiki_text(wiki_text: str) -> List[Dict[str, Any]]:
     print("[DEBUG] Entering parse_wiki_text")
+    lines = wiki_text.split("\n")
+    print(f"[DEBUG] Split input into {len(lines)} lines")
+    steps = parse_tokens(iter_tokens(lines))
+    profiling.count("lines_read", len(lines))
+    profiling.count("steps_emitted", len(steps))
+    return steps
+
+def parse_tokens(tokens: Iterable[Token]) -> List[Dict[str, Any]]:
+    """Build steps from wikitext tokens; only item tokens become steps."""
     steps = []
     try:
-        lines = wiki_text.split("\n")
-        print(f"[DEBUG] Split input into {len(lines)} lines")
-        for idx, line in enumerate(lines):
+        for tok in tokens:
+            idx, line = tok.lineno, tok.text
             print(f"[DEBUG] Processing line {idx}: {line}")
             try:
-                line = line.strip()
-                if not line or not line.startswith("*"):
+                if tok.kind != "item":
                     print(f"[DEBUG] Skipping line {idx}: empty or not a step")
                     continue
 
@@ -43,10 +55,9 @@ def parse_wiki_text(wiki_text: str) -> List[Dict[str, Any]]:
 
                 # Extract NPCs with optional dialogue options (e.g., (3,1))
                 try:
-                    npc_matches = re.findall(r"\[\[([^\]\|]+)(?:\|[^\]]*)?\]\](?:\s*\((\d+,\d+)\))?", line)
-                    print(f"[DEBUG] NPC matches for line {idx}: {npc_matches}")
-                    for npc, dialog in npc_matches:
-                        npc = npc.strip()
+                    print(f"[DEBUG] NPC matches for line {idx}: {tok.links}")
+                    for link in tok.links:
+                        npc, dialog = link.target, link.dialog
                         step["npc_names"].append(npc)
                         if dialog:
                             step["dialogue_options"] = [d.strip() for d in dialog.split(",")]
@@ -58,7 +69,7 @@ def parse_wiki_text(wiki_text: str) -> List[Dict[str, Any]]:
 
                 # Extract items (e.g., [[Bronze Dagger]], 3x Logs, Forestry Kit, or Leather Gloves on the table)
                 try:
-                    item_matches = re.findall(r"\[\[([^\]\|]+)(?:\|[^\]]*)?\]\](?:\((\d+)\))?|(\d+x)\s+([^\[\]\(\),;&]+(?:\s+[^\[\]\(\),;&]+)*)|([^\[\]\(\),;&]+(?:\s+[^\[\]\(\),;&]+)*)\s+(?:on|off|in|at)\s+(?:the|a)\s+([^\[\]\(\),;&]+)", line)
+                    item_matches = ITEM_RE.findall(line)
                     print(f"[DEBUG] Item matches for line {idx}: {item_matches}")
                     for match in item_matches:
                         if match[0]:  # [[Item]] format
@@ -145,7 +156,9 @@ def main():
         ap = argparse.ArgumentParser()
         ap.add_argument("--in", required=True, dest="input")
         ap.add_argument("--out", required=True)
+        profiling.add_arguments(ap, "parse_steps")
         args = ap.parse_args()
+        profiling.start("parse_steps", args.profile, args.profile_dump)
         print(f"[DEBUG] Parsed arguments: input={args.input}, out={args.out}")
 
         input_path = Path(args.input)
@@ -170,11 +183,12 @@ def main():
             print(f"[DEBUG] Error reading input file: {e}", file=sys.stderr)
             raise
 
-        steps = parse_wiki_text(wiki_text)
+        with profiling.stage("parse_steps", [input_path], [output_path]):
+            steps = parse_wiki_text(wiki_text)
         print(f"[DEBUG] Writing output to: {output_path}")
         try:
-            with output_path.open("w", encoding="utf-8") as f:
-                json.dump(steps, f, indent=2, ensure_ascii=False)
+            with profiling.stage("write", outputs=[output_path]):
+                jsonio.dump(steps, output_path, indent=2, ensure_ascii=False)
             print(f"Parsed {len(steps)} steps -> {output_path}")
             print(f"[DEBUG] Successfully wrote output to {output_path}")
         except Exception as e:
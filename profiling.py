@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+profiling.py
+--profile support shared by main.py, run_all.py and the stage scripts.
+While a Profiler is active each stage records wall and CPU time, the peak RSS
+of the process when it finished, the sizes of the files it read and wrote and
+named counters (files scanned, regex branch matches, fuzzy-match calls, cache
+hits, steps emitted, ...). The run is written as one JSON report; stage
+scripts launched by stages.py write their own report, which is nested under
+the stage that launched them. --profile-dump DIR also leaves a cProfile dump
+per stage (<script>.<stage>.prof, and one per scraper worker) in DIR.
+
+profiling.count() and profiling.stage() do nothing unless --profile was given.
+"""
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active: Optional["Profiler"] = None
+
+def peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+def path_sizes(paths: Iterable[Any]) -> Dict[str, Optional[int]]:
+    """Size in bytes of each path (summed over files for directories, None if missing)."""
+    sizes: Dict[str, Optional[int]] = {}
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            sizes[str(p)] = sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+        elif p.is_file():
+            sizes[str(p)] = p.stat().st_size
+        else:
+            sizes[str(p)] = None
+    return sizes
+
+class Profiler:
+    def __init__(self, name: str, dump_dir: Optional[Path] = None):
+        self.name = name
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.stages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self._current: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add n to a counter of the current stage (or of the run, outside stages)."""
+        with self._lock:
+            target = self._current["counters"] if self._current is not None else self.counters
+            target[name] = target.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def stage(self, name: str, inputs: Iterable[Any] = (), outputs: Iterable[Any] = ()):
+        entry: Dict[str, Any] = {"name": name, "inputs": path_sizes(inputs), "counters": {}}
+        outer, self._current = self._current, entry
+        # cProfile cannot nest, so only the outermost stage gets a dump.
+        prof = cProfile.Profile() if self.dump_dir and outer is None else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if prof:
+            prof.enable()
+        try:
+            yield entry
+        finally:
+            if prof:
+                prof.disable()
+                self.dump_dir.mkdir(parents=True, exist_ok=True)
+                prof.dump_stats(str(self.dump_dir / f"{self.name}.{name}.prof"))
+            entry["wall_s"] = round(time.perf_counter() - wall, 4)
+            entry["cpu_s"] = round(time.process_time() - cpu, 4)
+            entry["peak_rss_kb"] = peak_rss_kb()
+            entry["outputs"] = path_sizes(outputs)
+            self._current = outer
+            with self._lock:
+                self.stages.append(entry)
+
+    def subprocess_args(self, name: str) -> Tuple[List[str], Path]:
+        """Extra arguments that make a stage script profile itself, and where its report lands."""
+        fd, report = tempfile.mkstemp(prefix=f"profile_{name}_", suffix=".json")
+        os.close(fd)
+        args = ["--profile", report]
+        if self.dump_dir:
+            args += ["--profile-dump", str(self.dump_dir.resolve())]
+        return args, Path(report)
+
+    def record(self, name: str, wall_s: float, report: Optional[Path] = None, **fields: Any) -> None:
+        """Add a stage that ran in another process, nesting the report it wrote."""
+        entry: Dict[str, Any] = {"name": name, "wall_s": round(wall_s, 4), **fields}
+        if report is not None:
+            try:
+                if report.stat().st_size:
+                    entry["process"] = json.loads(report.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: no profile report from {name}: {e}", file=sys.stderr)
+            finally:
+                with contextlib.suppress(OSError):
+                    report.unlink()
+        with self._lock:
+            self.stages.append(entry)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "argv": sys.argv,
+            "started": self.started,
+            "wall_s": round(time.perf_counter() - self._wall, 4),
+            "cpu_s": round(time.process_time() - self._cpu, 4),
+            "peak_rss_kb": peak_rss_kb(),
+            "counters": self.counters,
+            "stages": self.stages,
+        }
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+def active() -> Optional[Profiler]:
+    return _active
+
+def count(name: str, n: int = 1) -> None:
+    if _active is not None:
+        _active.count(name, n)
+
+def stage(name: str, inputs: Iterable[Any] = (), outputs: Iterable[Any] = ()):
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.stage(name, inputs, outputs)
+
+def add_arguments(ap, name: str) -> None:
+    ap.add_argument("--profile", nargs="?", const=Path(f"profile_{name}.json"), default=None, type=Path,
+                    metavar="REPORT", help=f"Write a JSON timing/memory/counter report (default: profile_{name}.json)")
+    ap.add_argument("--profile-dump", type=Path, default=None, metavar="DIR",
+                    help="With --profile, also write a cProfile dump per stage to DIR")
+
+def start(name: str, report: Optional[Path], dump_dir: Optional[Path] = None) -> Optional[Profiler]:
+    """Activate profiling for this process; the report is written when it exits."""
+    global _active
+    if report is None:
+        return None
+    _active = Profiler(name, dump_dir)
+
+    def finish() -> None:
+        _active.write(report)
+        print(f"Profile report written to {report}", file=sys.stderr)
+
+    atexit.register(finish)
+    return _active
+
+def start_worker_dump(dump_dir: Path, name: str) -> None:
+    """Pool initializer: cProfile this worker until it exits (the pool must be closed, not terminated)."""
+    from multiprocessing import util
+
+    prof = cProfile.Profile()
+    prof.enable()
+
+    def dump() -> None:
+        prof.disable()
+        Path(dump_dir).mkdir(parents=True, exist_ok=True)
+        prof.dump_stats(str(Path(dump_dir) / f"{name}.worker-{os.getpid()}.prof"))
+
+    util.Finalize(None, dump, exitpriority=10)
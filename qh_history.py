@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+qh_history.py
+Scrape NPC/object worldpoints across a range of quest-helper revisions
+straight from a local git repository, without checking anything out.
+
+Trees and blobs are read through one long-lived `git cat-file --batch`
+process. Trees are cached by hash, so directories that did not change between
+revisions are not read again, and every distinct blob is scanned exactly once
+(in parallel) however many revisions contain it. Only commits that touch the
+helpers directory are considered.
+
+The output records where each entity's worldpoints came from:
+
+  {"repo": ..., "revs": [...], "src_path": ...,
+   "commits": [{"sha", "date", "subject"}, ...],          # oldest first
+   "npcs": {"COOK": {"id", "name", "worldpoints": [
+       {"point": [x, y, plane],
+        "spans": [[first, last], ...],                     # inclusive indexes into commits
+        "first_seen": sha, "last_seen": sha, "dropped_in": sha or null,
+        "origin": {"commit", "path", "line", "blob"},      # where it first appeared
+        "latest": {"path", "line", "blob"}}]}},            # where it was last seen
+   "objects": {...}}
+"""
+import argparse
+import json
+import subprocess
+import sys
+from multiprocessing import Pool, cpu_count
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import profiling
+import worldpointscraper
+from stages import GAMEVAL, QH_ROOT
+
+DEFAULT_SRC_PATH = "src/main/java/com/questhelper/helpers"
+
+class CatFile:
+    """A `git cat-file --batch` process; read() returns (oid, type, data) or None if missing."""
+
+    def __init__(self, repo: Path):
+        self.proc = subprocess.Popen(["git", "-C", str(repo), "cat-file", "--batch"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        self.proc.stdin.write(name.encode("utf-8") + b"\n")
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline().split()
+        if len(header) != 3:  # "<name> missing" / "<name> ambiguous"
+            return None
+        size = int(header[2])
+        data = self.proc.stdout.read(size)
+        self.proc.stdout.read(1)  # trailing LF
+        return header[0].decode(), header[1].decode(), data
+
+    def close(self) -> None:
+        self.proc.stdin.close()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_tree(data: bytes, oid_len: int) -> Iterator[Tuple[bytes, str, str]]:
+    """Entries of a raw tree object as (mode, name, oid)."""
+    i = 0
+    while i < len(data):
+        sp = data.index(b" ", i)
+        nul = data.index(b"\0", sp)
+        oid_end = nul + 1 + oid_len
+        yield data[i:sp], data[sp + 1:nul].decode("utf-8", "replace"), data[nul + 1:oid_end].hex()
+        i = oid_end
+
+class TreeIndex:
+    """Java blobs below a tree, memoised per tree hash."""
+
+    def __init__(self, cat: CatFile):
+        self.cat = cat
+        self.cache: Dict[str, List[Tuple[str, str]]] = {}
+
+    def java_blobs(self, tree_oid: str) -> List[Tuple[str, str]]:
+        cached = self.cache.get(tree_oid)
+        if cached is not None:
+            profiling.count("tree_cache_hits")
+            return cached
+        _, _, data = self.cat.read(tree_oid)
+        blobs = []
+        for mode, name, oid in parse_tree(data, len(tree_oid) // 2):
+            if mode == b"40000":
+                blobs.extend((f"{name}/{path}", blob) for path, blob in self.java_blobs(oid))
+            elif name.endswith(".java") and mode != b"160000":  # skip submodules
+                blobs.append((name, oid))
+        self.cache[tree_oid] = blobs
+        return blobs
+
+def list_commits(repo: Path, revs: List[str], src_path: str, first_parent: bool = True) -> List[Dict[str, str]]:
+    """Commits in revs that touch src_path, oldest first."""
+    cmd = ["git", "-C", str(repo), "log", "--reverse", "--format=%H%x00%cI%x00%s"]
+    if first_parent:
+        cmd.append("--first-parent")
+    out = subprocess.run(cmd + revs + ["--", src_path], check=True, capture_output=True,
+                         text=True, encoding="utf-8", errors="replace").stdout
+    commits = []
+    for line in out.splitlines():
+        sha, date, subject = line.split("\0", 2)
+        commits.append({"sha": sha, "date": date, "subject": subject})
+    return commits
+
+# Set in each worker by init_worker() so the ID maps are not pickled per blob.
+_idmaps = None
+
+def init_worker(idmaps) -> None:
+    global _idmaps
+    _idmaps = idmaps
+
+def scan_blob(task: Tuple[str, str, bytes]) -> Tuple[str, List[Tuple], int]:
+    """Worldpoint hits of one blob as (kind, key, id, name, x, y, plane, line)."""
+    oid, path, data = task
+    name = PurePosixPath(path)
+    # 'debug' is the level whose step records carry the entity id and name.
+    res = worldpointscraper.scan_text(data.decode("utf-8", "ignore"), name.name, name.stem, _idmaps, warn=False, fields="debug")
+    hits = [(wp["entity"]["kind"], wp["entity"]["key"], wp["entity"]["id"], wp["entity"]["name"],
+             wp["x"], wp["y"], wp["plane"], wp["line"])
+            for wp in res["wps"] if "entity" in wp]
+    return oid, hits, len(res["missing_ids"])
+
+def build_history(commits: List[Dict[str, str]], commit_files: List[List[Tuple[str, str]]],
+                  blob_hits: Dict[str, List[Tuple]], src_path: str) -> Dict[str, Any]:
+    """Fold per-blob hits over the commit sequence into spans per entity worldpoint."""
+    points: Dict[Tuple[str, str, Tuple[int, int, int]], Dict[str, Any]] = {}
+    for idx, files in enumerate(commit_files):
+        for path, oid in files:
+            for kind, key, ent_id, ent_name, x, y, plane, line in blob_hits.get(oid, ()):
+                k = (kind, key, (x, y, plane))
+                source = {"path": f"{src_path}/{path}", "line": line, "blob": oid}
+                rec = points.get(k)
+                if rec is None:
+                    points[k] = rec = {"id": ent_id, "name": ent_name, "spans": [[idx, idx]],
+                                       "origin": dict(source, commit=commits[idx]["sha"])}
+                elif rec["spans"][-1][1] == idx - 1:
+                    rec["spans"][-1][1] = idx
+                elif rec["spans"][-1][1] != idx:
+                    rec["spans"].append([idx, idx])
+                rec["latest"] = source
+
+    history: Dict[str, Dict[str, Any]] = {"npcs": {}, "objects": {}}
+    for (kind, key, point), rec in sorted(points.items()):
+        entity = history[kind].setdefault(key, {"id": rec["id"], "name": rec["name"], "worldpoints": []})
+        last = rec["spans"][-1][1]
+        entity["worldpoints"].append({
+            "point": list(point),
+            "spans": rec["spans"],
+            "first_seen": commits[rec["spans"][0][0]]["sha"],
+            "last_seen": commits[last]["sha"],
+            "dropped_in": commits[last + 1]["sha"] if last + 1 < len(commits) else None,
+            "origin": rec["origin"],
+            "latest": rec["latest"],
+        })
+    return history
+
+def scrape_history(repo: Path, revs: List[str], idmaps, src_path: str = DEFAULT_SRC_PATH,
+                   first_parent: bool = True, workers: Optional[int] = None) -> Dict[str, Any]:
+    with profiling.stage("list_commits"):
+        commits = list_commits(repo, revs, src_path, first_parent)
+    print(f"{len(commits)} commits touch {src_path}")
+
+    with CatFile(repo) as cat:
+        with profiling.stage("read_trees"):
+            trees = TreeIndex(cat)
+            commit_files = []
+            for c in commits:
+                root = cat.read(f"{c['sha']}:{src_path}")
+                commit_files.append(trees.java_blobs(root[0]) if root and root[1] == "tree" else [])
+            todo = {}
+            for files in commit_files:
+                for path, oid in files:
+                    todo.setdefault(oid, path)
+            total = sum(len(f) for f in commit_files)
+            profiling.count("file_versions", total)
+            profiling.count("unique_blobs", len(todo))
+        print(f"{total} file versions, {len(todo)} distinct blobs to scan")
+
+        def blob_tasks():
+            # Runs in the pool's task-feeding thread, the only user of cat meanwhile.
+            for oid, path in todo.items():
+                yield oid, path, cat.read(oid)[2]
+
+        blob_hits: Dict[str, List[Tuple]] = {}
+        missing = 0
+        with profiling.stage("scan_blobs"):
+            with Pool(processes=workers or cpu_count(), initializer=init_worker, initargs=(idmaps,)) as pool:
+                for oid, hits, n_missing in pool.imap_unordered(scan_blob, blob_tasks(), chunksize=16):
+                    blob_hits[oid] = hits
+                    missing += n_missing
+            profiling.count("files_scanned", len(blob_hits))
+        if missing:
+            print(f"Warning: {missing} NpcID/ObjectID references not found in the current ID files (renamed upstream?)")
+
+    with profiling.stage("build_history"):
+        history = build_history(commits, commit_files, blob_hits, src_path)
+    return {"repo": str(repo), "revs": revs, "src_path": src_path, "commits": commits, **history}
+
+def main():
+    script_dir = Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Scrape worldpoints across quest-helper revisions from a local git repo.")
+    ap.add_argument("--repo", type=Path, default=script_dir / "quest-helper-master",
+                    help="Local quest-helper git repository")
+    ap.add_argument("--revs", nargs="+", default=["HEAD"],
+                    help="Revisions for git log, e.g. v4.0.0..master or several refs")
+    ap.add_argument("--src-path", default=DEFAULT_SRC_PATH, help="Helpers directory inside the repository")
+    ap.add_argument("--all-parents", action="store_true", help="Follow merged branches, not only first parents")
+    ap.add_argument("--npc_ids", type=Path, default=script_dir / GAMEVAL / "NpcID.java")
+    ap.add_argument("--object_ids", type=Path, default=script_dir / GAMEVAL / "ObjectID.java")
+    ap.add_argument("--custom_object_ids", type=Path, default=script_dir / GAMEVAL / "ObjectID1.java")
+    ap.add_argument("--qh_object_ids", type=Path, default=script_dir / QH_ROOT / "util" / "QHObjectID.java")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", type=Path, default=script_dir / "QH_history.json")
+    profiling.add_arguments(ap, "qh_history")
+    args = ap.parse_args()
+    profiling.start("qh_history", args.profile, args.profile_dump)
+
+    with profiling.stage("load_id_files"):
+        idmaps = worldpointscraper.load_id_files(args.npc_ids, args.object_ids,
+                                                 args.custom_object_ids, args.qh_object_ids)
+    try:
+        history = scrape_history(args.repo, args.revs, idmaps, args.src_path,
+                                 first_parent=not args.all_parents, workers=args.workers)
+    except subprocess.CalledProcessError as e:
+        print(f"Error: {' '.join(e.cmd)} failed: {e.stderr.strip()}", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    n_points = sum(len(e["worldpoints"]) for kind in ("npcs", "objects") for e in history[kind].values())
+    print(f"History of {n_points} worldpoints over {len(history['commits'])} commits written to {args.out}")
+
+if __name__ == "__main__":
+    main()
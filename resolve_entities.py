@@ -11,25 +11,46 @@ import json
 import argparse
 import sys
 import difflib
+import functools
+from collections import Counter
 from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
+import dbdelta
+import jsonio
+import profiling
+import xref
+
 def const_case(name: str) -> str:
     return re.sub(r"[^A-Z0-9_]", "", name.upper().replace(" ", "_").replace("-", "_").replace("'", ""))
 
+RUNELITE_ID_RE = re.compile(r'/\*\*\n\s*\*\s*(.+?)\n\s*\*/\n\s*public static final int (\w+) = (\d+);', re.MULTILINE)
+
+def runelite_id_path(category: str, script_dir: Path) -> Optional[Path]:
+    gameval = script_dir / "runelite" / "runelite-api" / "src" / "main" / "java" / "net" / "runelite" / "api" / "gameval"
+    if category == "npcs":
+        return gameval / "NpcID.java"
+    if category == "objects":
+        return gameval / "ObjectID.java"
+    return None
+
+@functools.lru_cache(maxsize=None)
+def load_runelite_ids(file_path: Path) -> List[Tuple[str, str, str]]:
+    """Parse NpcID.java/ObjectID.java once into (comment name, constant, id) rows."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = f.read()
+    return [
+        (m.group(1).strip().lower().replace("'", ""), m.group(2).lower(), m.group(3))
+        for m in RUNELITE_ID_RE.finditer(data)
+    ]
+
 def fetch_runelite_id(name: str, category: str, script_dir: Path) -> Optional[Dict[str, Any]]:
     """
     Fetch NPC or object ID from local Runelite API files (NpcID.java or ObjectID.java).
     Returns a dict with name, id, and null worldpoints if found, else None.
     """
-    default_npc_ids = script_dir / "runelite" / "runelite-api" / "src" / "main" / "java" / "net" / "runelite" / "api" / "gameval" / "NpcID.java"
-    default_object_ids = script_dir / "runelite" / "runelite-api" / "src" / "main" / "java" / "net" / "runelite" / "api" / "gameval" / "ObjectID.java"
-
-    if category == "npcs":
-        file_path = default_npc_ids
-    elif category == "objects":
-        file_path = default_object_ids
-    else:
+    file_path = runelite_id_path(category, script_dir)
+    if file_path is None:
         return None
 
     if not file_path.exists():
@@ -37,16 +58,10 @@ def fetch_runelite_id(name: str, category: str, script_dir: Path) -> Optional[Di
         return None
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = f.read()
         # Parse for ID, looking for comment with name or constant definition
-        pattern = r'/\*\*\n\s*\*\s*(.+?)\n\s*\*/\n\s*public static final int (\w+) = (\d+);'
         name_lower = name.lower().replace("'", "")  # Remove apostrophes for matching
-        for match in re.finditer(pattern, data, re.MULTILINE):
-            comment_name = match.group(1).strip().lower().replace("'", "")
-            constant = match.group(2)
-            id_str = match.group(3)
-            if name_lower in comment_name or name_lower.replace(" ", "_") in constant.lower():
+        for comment_name, constant, id_str in load_runelite_ids(file_path):
+            if name_lower in comment_name or name_lower.replace(" ", "_") in constant:
                 return {
                     "name": name,
                     "id": int(id_str),
@@ -58,28 +73,30 @@ def fetch_runelite_id(name: str, category: str, script_dir: Path) -> Optional[Di
         print(f"Warning: Failed to fetch {category} ID for '{name}' from {file_path}: {e}", file=sys.stderr)
         return None
 
+def add_entity(entities: Dict[str, List[Dict[str, Any]]], name: str, entry: Dict[str, Any]) -> None:
+    if not name:
+        return
+    key = name.strip().lower()
+    rec = {
+        "name": entry.get("name", name),
+        "id": entry.get("id"),
+        "worldpoints": entry.get("worldpoints") or entry.get("points") or entry.get("locations") or None,
+        "comment": entry.get("comment")
+    }
+    entities.setdefault(key, []).append(rec)
+
 def load_entities(world_path: str, category: str) -> Dict[str, List[Dict[str, Any]]]:
     entities = {}
     def add_entry(name, entry):
-        if not name:
-            return
-        key = name.strip().lower()
-        rec = {
-            "name": entry.get("name", name),
-            "id": entry.get("id"),
-            "worldpoints": entry.get("worldpoints") or entry.get("points") or entry.get("locations") or None,
-            "comment": entry.get("comment")
-        }
-        entities.setdefault(key, []).append(rec)
+        add_entity(entities, name, entry)
 
     # Load worldpoints.json
     if Path(world_path).exists():
-        with open(world_path, "r", encoding="utf-8", errors="ignore") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error: Failed to parse {world_path}: {e}", file=sys.stderr)
-                raise
+        try:
+            data = jsonio.load(world_path, errors="ignore")
+        except json.JSONDecodeError as e:
+            print(f"Error: Failed to parse {world_path}: {e}", file=sys.stderr)
+            raise
         if isinstance(data, dict):
             if category in data and isinstance(data[category], dict):
                 for k, v in data[category].items():
@@ -100,12 +117,11 @@ def load_entities(world_path: str, category: str) -> Dict[str, List[Dict[str, An
 def load_items(path: str) -> Dict[str, Tuple[str, str]]:
     items = {}
     if Path(path).exists():
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Error: Failed to parse {path}: {e}", file=sys.stderr)
-                raise
+        try:
+            data = jsonio.load(path, errors="ignore")
+        except json.JSONDecodeError as e:
+            print(f"Error: Failed to parse {path}: {e}", file=sys.stderr)
+            raise
         if isinstance(data, dict):
             inner = data.get("items", data)
             if isinstance(inner, dict):
@@ -117,17 +133,57 @@ def load_items(path: str) -> Dict[str, Tuple[str, str]]:
         raise FileNotFoundError(f"{path} not found")
     return items
 
+def patch_entities(entdict: Dict[str, List[Dict[str, Any]]], changes: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Return a copy of a load_entities() dict with one category of a
+    worldpoints.json patch applied (see dbdelta.py). Only the names the patch
+    touches are rebuilt; entdict itself is left as it was, so readers holding
+    it are unaffected. Raises KeyError if an entity the patch expects is absent.
+    """
+    patched = dict(entdict)
+
+    def take(key: str, old: Dict[str, Any]) -> Dict[str, Any]:
+        name = (old.get("name") or key).strip().lower()
+        recs = list(patched.get(name, []))
+        for i, rec in enumerate(recs):
+            if rec["id"] == old.get("id"):
+                del recs[i]
+                if recs:
+                    patched[name] = recs
+                else:
+                    del patched[name]
+                return rec
+        raise KeyError(f"{key} ({name}) not in the loaded database")
+
+    def put(key: str, entry: Dict[str, Any]) -> None:
+        name = (entry.get("name") or key).strip().lower()
+        patched[name] = list(patched.get(name, []))
+        add_entity(patched, entry.get("name") or key, entry)
+
+    for key, old in changes.get("removed", {}).items():
+        take(key, old)
+    for key, change in changes.get("changed", {}).items():
+        rec = take(key, change.get("old", {}))
+        points = dbdelta.apply_points(rec["worldpoints"] or [], change)
+        put(key, {"id": change.get("id"), "name": change.get("name"), "worldpoints": points})
+    for key, entry in changes.get("added", {}).items():
+        put(key, entry)
+    return patched
+
 def resolve_entity(name: str, entdict: Dict[str, List[Dict[str, Any]]], category: str, cutoff=0.9) -> List[Dict[str, Any]]:
     script_dir = Path(__file__).parent
     key = name.strip().lower()
     if key in entdict:
+        profiling.count(f"{category}_exact_hits")
         return entdict[key]
+    profiling.count("fuzzy_match_calls")
     candidates = difflib.get_close_matches(key, entdict.keys(), n=3, cutoff=cutoff)
     res = []
     for c in candidates:
         res.extend(entdict[c])
     if not res:
         # Fetch ID from local Runelite API files
+        profiling.count("runelite_fallback_lookups")
         entity_data = fetch_runelite_id(name, category, script_dir)
         if entity_data:
             print(f"Added {category} '{name}' with ID {entity_data['id']} from Runelite API (null world point). Add world points manually in QuestFromWiki.java.", file=sys.stderr)
@@ -196,17 +252,20 @@ def resolve_item(item: Dict[str, Any], itemdict: Dict[str, Tuple[str, str]], cut
         # Prefer unpoisoned variant unless explicitly poisoned
         unp_key = f"{norm_lower}#(unp)"
         if not is_poisoned and unp_key in itemdict:
+            profiling.count("items_exact_hits")
             canonical, item_id = itemdict[unp_key]
             if item_id.isdigit():
                 results.append((name, canonical, item_id, quantity))
             continue
         # Direct match
         if norm_lower in itemdict:
+            profiling.count("items_exact_hits")
             canonical, item_id = itemdict[norm_lower]
             if item_id.isdigit():
                 results.append((name, canonical, item_id, quantity))
             continue
         # Special handling for "Treasure Scroll"
+        profiling.count("fuzzy_match_calls")
         if "treasure scroll" in norm_lower:
             candidates = difflib.get_close_matches("clue scroll (beginner)", itemdict.keys(), n=1, cutoff=cutoff)
             if candidates:
@@ -231,27 +290,38 @@ def resolve_item(item: Dict[str, Any], itemdict: Dict[str, Tuple[str, str]], cut
             print(f"Warning: No match for item '{name}' in item database", file=sys.stderr)
     return results
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--steps", required=True)
-    ap.add_argument("--world", required=True)
-    ap.add_argument("--items", required=True)
-    ap.add_argument("--out", required=True)
-    args = ap.parse_args()
-
-    try:
-        steps = json.load(open(args.steps, "r", encoding="utf-8"))
-    except FileNotFoundError:
-        print(f"Error: {args.steps} not found", file=sys.stderr)
-        raise
-    except json.JSONDecodeError as e:
-        print(f"Error: Failed to parse {args.steps}: {e}", file=sys.stderr)
-        raise
-
-    npcdict = load_entities(args.world, "npcs")
-    objectdict = load_entities(args.world, "objects")
-    itemdict = load_items(args.items)
+def rank_by_cooccurrence(steps: List[Dict[str, Any]], xref_index) -> None:
+    """
+    Reorder ambiguous matches (a query with several candidate ids) so that
+    candidates used in the same quest helpers as the guide's unambiguous
+    matches come first. The order is otherwise kept, so ties stay as they were.
+    """
+    for matches_key, kind in (("npc_matches", "npcs"), ("object_matches", "objects")):
+        groups = []
+        context = Counter()
+        for s in steps:
+            by_query: Dict[str, List[Dict[str, Any]]] = {}
+            for m in s[matches_key]:
+                by_query.setdefault(m["query"], []).append(m)
+            groups.append((s, by_query))
+            for candidates in by_query.values():
+                if len({m["id"] for m in candidates}) == 1:
+                    context.update(xref_index.quests_for_id(kind, candidates[0]["id"]))
+        if not context:
+            continue
+        for s, by_query in groups:
+            if all(len({m["id"] for m in c}) == 1 for c in by_query.values()):
+                continue
+            ranked = []
+            for candidates in by_query.values():
+                ranked.extend(sorted(candidates, key=lambda m: -xref_index.cooccurrence(kind, m["id"], context)))
+            if ranked != s[matches_key]:
+                profiling.count("cooccurrence_reorders")
+                s[matches_key] = ranked
 
+def match_steps(steps: List[Dict[str, Any]], npcdict: Dict[str, List[Dict[str, Any]]],
+                objectdict: Dict[str, List[Dict[str, Any]]], itemdict: Dict[str, Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Add every NPC, object and item match to parsed steps in place, in database order."""
     for s in steps:
         s["npc_matches"] = []
         s["object_matches"] = []
@@ -289,6 +359,17 @@ def main():
                     "item_id": item_id,
                     "quantity": quantity
                 })
+    return steps
+
+def choose_matches(steps: List[Dict[str, Any]], xref_index=None) -> List[Dict[str, Any]]:
+    """
+    Fill in the resolved fields of matched steps from their first matches.
+    Ranking by co-occurrence looks at the whole guide, so pass all of its
+    steps at once.
+    """
+    if xref_index is not None:
+        rank_by_cooccurrence(steps, xref_index)
+    for s in steps:
         if s["npc_matches"]:
             m = s["npc_matches"][0]
             s["npc_name_resolved"] = m["name"]
@@ -307,10 +388,57 @@ def main():
                 s["comment"] = m["comment"]
         if s["item_matches"]:
             s["items_required"] = [m["query"] for m in s["item_matches"]]
+    profiling.count("steps_resolved", len(steps))
+    return steps
+
+def resolve_steps(steps: List[Dict[str, Any]], npcdict: Dict[str, List[Dict[str, Any]]],
+                  objectdict: Dict[str, List[Dict[str, Any]]], itemdict: Dict[str, Tuple[str, str]],
+                  xref_index=None) -> List[Dict[str, Any]]:
+    """Enrich parsed steps in place with NPC, object and item matches; an xref.XrefIndex breaks ties."""
+    return choose_matches(match_steps(steps, npcdict, objectdict, itemdict), xref_index)
+
+def resolve_with_daemon_or_local(steps: List[Dict[str, Any]], world_path: str, items_path: str,
+                                 use_daemon: bool = True) -> List[Dict[str, Any]]:
+    """Resolve through a running resolver_daemon when possible, else load the databases here."""
+    if use_daemon:
+        import resolver_daemon
+        enriched = resolver_daemon.try_resolve(steps, world_path, items_path)
+        if enriched is not None:
+            profiling.count("daemon_resolves")
+            print(f"Resolved {len(enriched)} steps via resolver daemon", file=sys.stderr)
+            return enriched
+
+    npcdict = load_entities(world_path, "npcs")
+    objectdict = load_entities(world_path, "objects")
+    itemdict = load_items(items_path)
+    xref_index = xref.XrefIndex.load_if_exists(xref.default_path(world_path))
+    return resolve_steps(steps, npcdict, objectdict, itemdict, xref_index)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", required=True)
+    ap.add_argument("--world", required=True)
+    ap.add_argument("--items", required=True)
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--no-daemon", action="store_true", help="Always load the databases in this process")
+    profiling.add_arguments(ap, "resolve_entities")
+    args = ap.parse_args()
+    profiling.start("resolve_entities", args.profile, args.profile_dump)
+
+    try:
+        steps = jsonio.load(args.steps)
+    except FileNotFoundError:
+        print(f"Error: {args.steps} not found", file=sys.stderr)
+        raise
+    except json.JSONDecodeError as e:
+        print(f"Error: Failed to parse {args.steps}: {e}", file=sys.stderr)
+        raise
+
+    with profiling.stage("resolve", [args.steps, args.world, args.items]):
+        steps = resolve_with_daemon_or_local(steps, args.world, args.items, use_daemon=not args.no_daemon)
 
-    with open(args.out, "w", encoding="utf-8") as w:
-        json.dump(steps, w, ensure_ascii=False, indent=2)
+    jsonio.dump(steps, args.out, ensure_ascii=False, indent=2)
     print(f"Enriched {len(steps)} steps -> {args.out}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+resolver_daemon.py
+Optional resident resolver. Loads worldpoints.json, OSRS ID List.json,
+entity_xref.json and the RuneLite gameval ID files once, keeps them indexed
+in memory and answers batched resolve requests over a Unix socket. resolve_entities.py and run_all.py
+use it automatically when it is running and load the databases themselves
+otherwise.
+
+Protocol: one JSON object per line in each direction.
+  {"op": "ping"}                                        -> {"ok": true, "world": ..., "items": ...}
+  {"op": "resolve", "world": ..., "items": ..., "stamps": {...}, "steps": [...]} -> {"ok": true, "steps": [...]}
+  {"op": "reload"}                                      -> {"ok": true}
+  {"op": "patch", "world": ..., "patch": PATH}          -> {"ok": true, "reloaded": bool}
+A patch (see dbdelta.py) made against the loaded worldpoints.json is applied
+to the in-memory databases, and entity_xref.json is reloaded with it if it
+changed; any other patch triggers a full reload.
+Requests naming different database files than the daemon loaded get
+{"ok": false, ...} so the caller falls back to loading them itself.
+"stamps" holds the [size, mtime] the caller sees for worldpoints.json,
+OSRS ID List.json and entity_xref.json (see file_stamps); when they differ
+from the files the daemon loaded, and the contents did change, it reloads
+before resolving, so a rewrite without a patch is never answered from
+stale databases.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import dbdelta
+import resolve_entities
+import xref
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_SOCKET = os.environ.get("RESOLVER_SOCKET", str(SCRIPT_DIR / ".resolver.sock"))
+
+def file_stamps(world_path: str, items_path: str) -> Dict[str, Optional[List[int]]]:
+    """[size, mtime_ns] of the database files a resolve depends on (None if missing)."""
+    stamps = {}
+    for name, path in (("world", world_path), ("items", items_path),
+                       ("xref", str(xref.default_path(world_path)))):
+        try:
+            st = os.stat(path)
+            stamps[name] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            stamps[name] = None
+    return stamps
+
+class ResolverState:
+    def __init__(self, world_path: str, items_path: str):
+        self.world_path = os.path.abspath(world_path)
+        self.items_path = os.path.abspath(items_path)
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        # Stamped before reading, so a write during the load shows up as a change on the next request.
+        stamps = file_stamps(self.world_path, self.items_path)
+        world_sha = dbdelta.file_sha1(self.world_path) if os.path.exists(self.world_path) else None
+        npcdict = resolve_entities.load_entities(self.world_path, "npcs")
+        objectdict = resolve_entities.load_entities(self.world_path, "objects")
+        itemdict = resolve_entities.load_items(self.items_path)
+        xref_index = xref.XrefIndex.load_if_exists(xref.default_path(self.world_path))
+        # Warm the gameval fallback so the first miss does not pay for parsing.
+        resolve_entities.load_runelite_ids.cache_clear()
+        for category in ("npcs", "objects"):
+            path = resolve_entities.runelite_id_path(category, SCRIPT_DIR)
+            if path is not None and path.exists():
+                resolve_entities.load_runelite_ids(path)
+        with self.lock:
+            self.databases = (npcdict, objectdict, itemdict)
+            self.xref_index = xref_index
+            self.world_sha = world_sha
+            self.stamps = stamps
+        print(f"Loaded {len(npcdict)} npcs, {len(objectdict)} objects, {len(itemdict)} items")
+
+    def apply_patch(self, patch_path: str) -> bool:
+        """Patch the loaded entities in place; reloads everything and returns False if the patch does not fit."""
+        try:
+            patch = dbdelta.load_patch(patch_path)
+            stamps = file_stamps(self.world_path, self.items_path)
+            with self.lock:
+                xref_changed = stamps["xref"] != self.stamps.get("xref")
+            # worldpointscraper.py writes entity_xref.json before it sends the patch.
+            xref_index = xref.XrefIndex.load_if_exists(xref.default_path(self.world_path)) if xref_changed else None
+            with self.lock:
+                if xref_changed:
+                    self.xref_index = xref_index
+                    self.stamps["xref"] = stamps["xref"]
+                npcdict, objectdict, itemdict = self.databases
+                if patch["result"] == self.world_sha:
+                    return True  # already applied
+                if patch["base"] != self.world_sha:
+                    raise ValueError("patch was made against a different worldpoints.json")
+                npcdict = resolve_entities.patch_entities(npcdict, patch.get("npcs", {}))
+                objectdict = resolve_entities.patch_entities(objectdict, patch.get("objects", {}))
+                self.databases = (npcdict, objectdict, itemdict)
+                self.world_sha = patch["result"]
+                self.stamps["world"] = stamps["world"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: cannot apply {patch_path} ({e}), reloading", file=sys.stderr)
+            self.load()
+            return False
+        print(f"Patched databases: {dbdelta.summary(patch)}")
+        return True
+
+    def refresh(self, stamps: Dict[str, Any]) -> None:
+        """Reload unless only the world file's stamp moved and its content is what is loaded."""
+        with self.lock:
+            loaded = dict(self.stamps)
+            world_sha = self.world_sha
+        if stamps == loaded:
+            return
+        changed = [name for name in stamps if stamps[name] != loaded.get(name)]
+        if changed == ["world"] and os.path.exists(self.world_path) and dbdelta.file_sha1(self.world_path) == world_sha:
+            with self.lock:
+                self.stamps["world"] = stamps["world"]
+            return
+        print(f"{', '.join(changed)} changed on disk, reloading")
+        self.load()
+
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        op = req.get("op")
+        if op == "ping":
+            return {"ok": True, "world": self.world_path, "items": self.items_path}
+        if op == "reload":
+            self.load()
+            return {"ok": True}
+        if op == "patch":
+            if os.path.abspath(req.get("world", "")) != self.world_path:
+                return {"ok": False, "error": "daemon serves a different worldpoints file"}
+            return {"ok": True, "reloaded": not self.apply_patch(req["patch"])}
+        if op == "resolve":
+            if (os.path.abspath(req.get("world", "")) != self.world_path
+                    or os.path.abspath(req.get("items", "")) != self.items_path):
+                return {"ok": False, "error": "daemon serves different database files"}
+            if not isinstance(req.get("stamps"), dict):
+                return {"ok": False, "error": "request has no file stamps"}
+            self.refresh(req["stamps"])
+            with self.lock:
+                databases, xref_index = self.databases, self.xref_index
+            return {"ok": True, "steps": resolve_entities.resolve_steps(req["steps"], *databases, xref_index)}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                resp = self.server.state.handle(json.loads(line))
+            except Exception as e:
+                resp = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(resp, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+class ResolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def request(req: Dict[str, Any], socket_path: str = DEFAULT_SOCKET, timeout: float = 60.0) -> Optional[Dict[str, Any]]:
+    """Send one request; returns None when no daemon is listening."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            with sock.makefile("rwb") as f:
+                f.write(json.dumps(req, ensure_ascii=False).encode("utf-8") + b"\n")
+                f.flush()
+                line = f.readline()
+    except OSError:
+        return None
+    return json.loads(line) if line else None
+
+def try_resolve(steps: List[Dict[str, Any]], world_path: str, items_path: str,
+                socket_path: str = DEFAULT_SOCKET) -> Optional[List[Dict[str, Any]]]:
+    """Resolve steps through the daemon, or return None so the caller resolves locally."""
+    resp = request({"op": "resolve", "world": os.path.abspath(world_path),
+                    "items": os.path.abspath(items_path), "stamps": file_stamps(world_path, items_path),
+                    "steps": steps}, socket_path)
+    if not resp or not resp.get("ok"):
+        return None
+    return resp["steps"]
+
+def send_patch(world_path: str, patch_path: str, socket_path: str = DEFAULT_SOCKET) -> Optional[Dict[str, Any]]:
+    """Tell a running daemon that world_path was patched; returns None when no daemon is listening."""
+    return request({"op": "patch", "world": os.path.abspath(world_path),
+                    "patch": os.path.abspath(patch_path)}, socket_path)
+
+def serve(world_path: str, items_path: str, socket_path: str = DEFAULT_SOCKET) -> None:
+    if os.path.exists(socket_path):
+        if request({"op": "ping"}, socket_path, timeout=2.0):
+            print(f"Error: a resolver daemon is already listening on {socket_path}", file=sys.stderr)
+            sys.exit(1)
+        os.unlink(socket_path)  # stale socket from a daemon that died
+
+    server = ResolverServer(socket_path, Handler)
+    server.state = ResolverState(world_path, items_path)
+    print(f"Resolver daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep the resolver databases loaded and serve them over a Unix socket.")
+    ap.add_argument("--world", default=str(SCRIPT_DIR / "worldpoints.json"))
+    ap.add_argument("--items", default=str(SCRIPT_DIR / "OSRS ID List.json"))
+    ap.add_argument("--socket", default=DEFAULT_SOCKET)
+    ap.add_argument("--reload", action="store_true", help="Ask a running daemon to reload its databases and exit")
+    ap.add_argument("--patch", metavar="FILE", help="Ask a running daemon to apply a worldpoints patch and exit")
+    args = ap.parse_args()
+
+    if args.reload:
+        resp = request({"op": "reload"}, args.socket)
+        print("Reloaded" if resp and resp.get("ok") else "No daemon running")
+        return
+
+    if args.patch:
+        resp = send_patch(args.world, args.patch, args.socket)
+        if not resp:
+            print("No daemon running")
+        elif not resp.get("ok"):
+            print(f"Error: {resp.get('error')}", file=sys.stderr)
+            sys.exit(1)
+        else:
+            print("Reloaded" if resp.get("reloaded") else "Patched")
+        return
+
+    serve(args.world, args.items, args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,26 @@
 """
 run_all.py
 Convenience script to run the full quest helper conversion pipeline.
+By default the stages run in this process and hand Python objects to each
+other; intermediate JSON is only written when checkpoints are requested.
+Use --subprocess for the old one-script-per-stage behaviour, and --batch
+MANIFEST to convert many guides with the databases loaded once (see batch.py).
 """
+import argparse
 import subprocess
 import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import batch
+import parse_steps
+import resolve_entities
+import generate_java
+import jsonio
+import profiling
+import validate_java
+import watch
 
 def run_command(command):
     print(f"Running: {' '.join(command)}")
@@ -18,30 +35,134 @@ def run_command(command):
         print(e.stderr, file=sys.stderr)
         raise
 
+def write_checkpoint(steps: List[Dict[str, Any]], path: Path) -> None:
+    jsonio.dump(steps, path, ensure_ascii=False, indent=2)
+    print(f"Checkpoint: {len(steps)} steps -> {path}")
+
+def parse_stage(wiki_path: Path) -> List[Dict[str, Any]]:
+    wiki_text = Path(wiki_path).read_text(encoding="latin1")
+    return parse_steps.parse_wiki_text(wiki_text)
+
+def resolve_stage(steps: List[Dict[str, Any]], world_path: Path, items_path: Path) -> List[Dict[str, Any]]:
+    return resolve_entities.resolve_with_daemon_or_local(steps, str(world_path), str(items_path))
+
+def load_parsed(parsed_path: Path) -> List[Dict[str, Any]]:
+    return jsonio.load(parsed_path)
+
+def run_pipeline(wiki_path: Path, world_path: Path, items_path: Path, out_path: Path,
+                 classname: str = "QuestFromWiki", checkpoint_dir: Optional[Path] = None,
+                 parsed_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """
+    Run parse -> resolve -> generate in-process and return the enriched steps.
+    When checkpoint_dir is given, steps_parsed.json and steps_enriched.json are
+    written there, matching the files the standalone scripts produce.
+    When parsed_path is given, parsing is skipped and those steps are resolved.
+    """
+    if parsed_path is not None:
+        with profiling.stage("load_parsed", [parsed_path]):
+            steps = load_parsed(parsed_path)
+    else:
+        with profiling.stage("parse_steps", [wiki_path]):
+            steps = parse_stage(wiki_path)
+        if checkpoint_dir is not None:
+            write_checkpoint(steps, Path(checkpoint_dir) / "steps_parsed.json")
+
+    with profiling.stage("resolve_entities", [world_path, items_path]):
+        steps = resolve_stage(steps, world_path, items_path)
+    if checkpoint_dir is not None:
+        write_checkpoint(steps, Path(checkpoint_dir) / "steps_enriched.json")
+
+    with profiling.stage("generate_java", outputs=[out_path]):
+        generate_java.generate_java(steps, classname, str(out_path))
+    return steps
+
+def run_subprocess_pipeline(base_dir: str, wiki_path: Path, world_path: Path, items_path: Path, out_path: Path,
+                            classname: str = "QuestFromWiki", checkpoint_dir: Optional[Path] = None,
+                            parsed_path: Optional[Path] = None, validate: bool = False) -> None:
+    """
+    Run each stage as its own script with JSON hand-off. The intermediate
+    steps_parsed.json/steps_enriched.json go to checkpoint_dir (default: the
+    script folder); with parsed_path, parsing is skipped.
+    """
+    hand_off = Path(checkpoint_dir) if checkpoint_dir is not None else Path(base_dir)
+    enriched_path = hand_off / "steps_enriched.json"
+    hand_off.mkdir(parents=True, exist_ok=True)
+    if parsed_path is None:
+        parsed_path = hand_off / "steps_parsed.json"
+        run_command([
+            sys.executable, os.path.join(base_dir, "parse_steps.py"),
+            "--in", str(wiki_path),
+            "--out", str(parsed_path)
+        ])
+    run_command([
+        sys.executable, os.path.join(base_dir, "resolve_entities.py"),
+        "--steps", str(parsed_path),
+        "--world", str(world_path),
+        "--items", str(items_path),
+        "--out", str(enriched_path)
+    ])
+    run_command([
+        sys.executable, os.path.join(base_dir, "generate_java.py"),
+        "--in", str(enriched_path),
+        "--classname", classname,
+        "--out", str(out_path)
+    ] + (["--validate"] if validate else []))
+
 def main():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    parse_steps = [
-        "python", os.path.join(base_dir, "parse_steps.py"),
-        "--in", os.path.join(base_dir, "wiki_cleaned.txt"),
-        "--out", os.path.join(base_dir, "steps_parsed.json")
-    ]
-    resolve_entities = [
-        "python", os.path.join(base_dir, "resolve_entities.py"),
-        "--steps", os.path.join(base_dir, "steps_parsed.json"),
-        "--world", os.path.join(base_dir, "worldpoints.json"),
-        "--items", os.path.join(base_dir, "OSRS ID List.json"),
-        "--out", os.path.join(base_dir, "steps_enriched.json")
-    ]
-    generate_java = [
-        "python", os.path.join(base_dir, "generate_java.py"),
-        "--in", os.path.join(base_dir, "steps_enriched.json"),
-        "--classname", "QuestFromWiki",
-        "--out", os.path.join(base_dir, "QuestFromWiki.java")
-    ]
-
-    run_command(parse_steps)
-    run_command(resolve_entities)
-    run_command(generate_java)
+    base_dir = Path(__file__).resolve().parent
+    ap = argparse.ArgumentParser(description="Run the wiki -> Java conversion pipeline.")
+    ap.add_argument("--in", dest="input", default=base_dir / "wiki_cleaned.txt", type=Path)
+    ap.add_argument("--world", default=base_dir / "worldpoints.json", type=Path)
+    ap.add_argument("--items", default=base_dir / "OSRS ID List.json", type=Path)
+    ap.add_argument("--classname", default="QuestFromWiki")
+    ap.add_argument("--out", default=base_dir / "QuestFromWiki.java", type=Path)
+    ap.add_argument("--parsed", default=None, type=Path,
+                    help="Start from an existing steps_parsed.json instead of parsing --in")
+    ap.add_argument("--checkpoints", nargs="?", const=base_dir, default=None, type=Path,
+                    help="Write steps_parsed.json/steps_enriched.json (to DIR, default: script folder)")
+    ap.add_argument("--watch", action="store_true",
+                    help="Keep running and regenerate on changes to the wiki input, databases or quest-helper tree")
+    ap.add_argument("--validate", action="store_true",
+                    help="Check the generated NpcID/ObjectID/ItemID references against the RuneLite sources; exit 1 on unknown ones")
+    ap.add_argument("--batch", metavar="MANIFEST", type=Path,
+                    help="Convert every guide listed in a JSON manifest, one Java class each (see batch.py)")
+    ap.add_argument("--out-dir", type=Path, default=None,
+                    help="Where --batch writes classes without an explicit out (default: the manifest's folder)")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    ap.add_argument("--subprocess", action="store_true",
+                    help="Run each stage as a separate script with JSON hand-off (legacy mode)")
+    profiling.add_arguments(ap, "run_all")
+    args = ap.parse_args()
+    profiling.start("run_all", args.profile, args.profile_dump)
+
+    if args.subprocess:
+        try:
+            run_subprocess_pipeline(str(base_dir), args.input, args.world, args.items, args.out, args.classname,
+                                    args.checkpoints, args.parsed, args.validate)
+        except subprocess.CalledProcessError:
+            sys.exit(1)
+        return
+
+    if args.batch:
+        try:
+            ok = batch.run_batch(args.batch, args.world, args.items, base_dir, args.out_dir, args.workers, args.validate)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not ok:
+            sys.exit(1)
+        return
+
+    if args.watch:
+        watch.watch(base_dir, args.input, args.world, args.items, args.out, args.classname)
+        return
+
+    run_pipeline(args.input, args.world, args.items, args.out, args.classname, args.checkpoints, args.parsed)
+    if args.validate:
+        with profiling.stage("validate", [args.out]):
+            ok = validate_java.report(args.out, validate_java.validate_file(args.out, base_dir))
+        if not ok:
+            sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+shards.py
+Sharded mode: every bank of the guide is cleaned, parsed and matched as its
+own unit under shards/bank_NNN/ (wiki.txt, wiki_cleaned.txt, steps_parsed.json,
+steps_matched.json, log.txt). A shard is only reprocessed when its wikitext,
+the stage scripts or the databases changed; dirty shards run in parallel and
+all selected shards are merged into one Java class at the end. Ambiguous
+matches are ranked by co-occurrence (entity_xref.json) over the merged steps,
+so the result matches run_all for the same banks.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cleanwiki
+import parse_steps
+import resolve_entities
+import generate_java
+import profiling
+import xref
+
+SHARD_DIR = "shards"
+STAGE_SOURCES = ["cleanwiki.py", "parse_steps.py", "wikitext.py", "resolve_entities.py"]
+
+# Databases loaded once per worker process by init_worker().
+_databases = None
+
+def file_digest(paths: List[Path]) -> str:
+    h = hashlib.sha1()
+    for p in paths:
+        h.update(str(p.name).encode())
+        if p.is_file():
+            with open(p, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+def bank_texts(text: str, index: dict, lo: Optional[int], hi: Optional[int]) -> Dict[int, str]:
+    """Wikitext of each selected bank, in document order (repeated bank numbers are joined)."""
+    banks: Dict[int, str] = {}
+    for bank_no, begin, end in index["blocks"]:
+        if bank_no is None:
+            continue
+        if lo is not None and hi is not None and not lo <= bank_no <= hi:
+            continue
+        banks[bank_no] = banks.get(bank_no, "") + text[begin:end]
+    return banks
+
+def shard_key(block_text: str, env_digest: str) -> str:
+    return hashlib.sha1((env_digest + "\0" + block_text).encode("utf-8")).hexdigest()
+
+def init_worker(world_path: str, items_path: str) -> None:
+    global _databases
+    _databases = (
+        resolve_entities.load_entities(world_path, "npcs"),
+        resolve_entities.load_entities(world_path, "objects"),
+        resolve_entities.load_items(items_path),
+    )
+
+def write_json(data: Any, path: Path) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def process_shard(args: Tuple[int, str, str, str]) -> Tuple[int, int]:
+    """Clean, parse and match one bank, writing its artifacts to shard_dir."""
+    bank_no, block_text, shard_dir, key = args
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    (shard_dir / "wiki.txt").write_text(block_text, encoding="utf-8")
+
+    with open(shard_dir / "log.txt", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        # Banks are numbered consecutively, so the running counter before
+        # bank N is N - 1.
+        cleaned = cleanwiki.clean_lines(block_text.splitlines(), bank_number=bank_no - 1)
+        cleaned_text = "\n".join(cleaned) + "\n"
+        (shard_dir / "wiki_cleaned.txt").write_text(cleaned_text, encoding="utf-8")
+
+        steps = parse_steps.parse_wiki_text(cleaned_text)
+        write_json(steps, shard_dir / "steps_parsed.json")
+
+        resolve_entities.match_steps(steps, *_databases)
+        write_json(steps, shard_dir / "steps_matched.json")
+
+    write_json({"bank": bank_no, "key": key, "steps": len(steps)}, shard_dir / "shard.json")
+    return bank_no, len(steps)
+
+def shard_is_current(shard_dir: Path, key: str) -> bool:
+    meta_path = shard_dir / "shard.json"
+    if not meta_path.is_file() or not (shard_dir / "steps_matched.json").is_file():
+        return False
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8")).get("key") == key
+    except json.JSONDecodeError:
+        return False
+
+def run_sharded(text: str, index: dict, lo: Optional[int], hi: Optional[int], root: Path,
+                out_path: Path, classname: str = "QuestFromWiki", workers: Optional[int] = None,
+                world_path: Optional[Path] = None, items_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Process the selected banks as shards and merge them into one Java class."""
+    world_path = world_path or root / "worldpoints.json"
+    items_path = items_path or root / "OSRS ID List.json"
+    shard_root = root / SHARD_DIR
+
+    env_digest = file_digest([root / s for s in STAGE_SOURCES] + [world_path, items_path])
+    banks = bank_texts(text, index, lo, hi)
+
+    dirty = []
+    for bank_no, block_text in banks.items():
+        shard_dir = shard_root / f"bank_{bank_no:03d}"
+        key = shard_key(block_text, env_digest)
+        if not shard_is_current(shard_dir, key):
+            dirty.append((bank_no, block_text, str(shard_dir), key))
+
+    print(f"[INFO] {len(banks)} bank shards selected, {len(dirty)} need processing.")
+    profiling.count("shards_reused", len(banks) - len(dirty))
+    profiling.count("shards_processed", len(dirty))
+    if dirty:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(str(world_path), str(items_path))) as pool:
+            for bank_no, n_steps in pool.map(process_shard, dirty):
+                print(f"[INFO] Bank {bank_no}: {n_steps} steps")
+
+    merged: List[Dict[str, Any]] = []
+    for bank_no in banks:
+        with open(shard_root / f"bank_{bank_no:03d}" / "steps_matched.json", "r", encoding="utf-8") as f:
+            merged.extend(json.load(f))
+
+    resolve_entities.choose_matches(merged, xref.XrefIndex.load_if_exists(xref.default_path(world_path)))
+    generate_java.generate_java(merged, classname, str(out_path))
+    return merged
+
+def main():
+    import main as fetcher
+
+    root = Path(__file__).resolve().parent
+    ap = argparse.ArgumentParser(description="Convert the guide bank by bank, reusing unchanged shards.")
+    ap.add_argument("--wiki", type=Path, help="Raw wikitext file (default: fetch the guide via the local cache)")
+    ap.add_argument("--banks", default="all", help="'all' or N-M")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--classname", default="QuestFromWiki")
+    ap.add_argument("--out", type=Path, default=root / "QuestFromWiki.java")
+    args = ap.parse_args()
+
+    lo = hi = None
+    if args.banks != "all":
+        lo, hi = map(int, args.banks.split("-"))
+
+    text = args.wiki.read_text(encoding="utf-8") if args.wiki else fetcher.fetch_wikitext(fetcher.URL)
+    index = fetcher.build_bank_index(text)
+    try:
+        run_sharded(text, index, lo, hi, root, args.out, args.classname, args.workers)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+stages.py
+Make-like stage graph for the helper scripts that main.py runs.
+Each stage lists the files (or directory trees) it reads and writes. Before
+running a stage its inputs are content-hashed; if the digest matches the one
+recorded after the last successful run and the outputs are still the ones that
+run produced, the stage is skipped. State lives in .pipeline_state.json.
+Stages whose dependencies are satisfied run concurrently, so the wiki branch
+(cleanwiki -> parse_steps) and the database branch (worldpointscraper, which
+writes worldpoints.json directly) overlap and only join at run_all. Each stage's output is
+streamed with a [stage] prefix; the first failure stops the other branches.
+Under --profile each script is run with --profile too and its report is
+nested in this process's report.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import profiling
+
+STATE_FILE = ".pipeline_state.json"
+
+QH_ROOT = Path("quest-helper-master") / "src" / "main" / "java" / "com" / "questhelper"
+GAMEVAL = Path("runelite") / "runelite-api" / "src" / "main" / "java" / "net" / "runelite" / "api" / "gameval"
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: List[Path]
+    outputs: List[Path]
+    deps: List[str] = field(default_factory=list)
+    args: List[str] = field(default_factory=list)
+
+STAGES = [
+    Stage("cleanwiki", "cleanwiki.py",
+          inputs=[Path("wiki.txt"), Path("cleanwiki.py"), Path("wikitext.py")],
+          outputs=[Path("wiki_cleaned.txt")]),
+    Stage("parse_steps", "parse_steps.py",
+          inputs=[Path("wiki_cleaned.txt"), Path("parse_steps.py"), Path("wikitext.py"), Path("jsonio.py")],
+          outputs=[Path("steps_parsed.json")],
+          deps=["cleanwiki"],
+          args=["--in", "wiki_cleaned.txt", "--out", "steps_parsed.json"]),
+    Stage("worldpointscraper", "worldpointscraper.py",
+          inputs=[QH_ROOT / "helpers", QH_ROOT / "util" / "QHObjectID.java",
+                  GAMEVAL / "NpcID.java", GAMEVAL / "ObjectID.java", GAMEVAL / "ObjectID1.java",
+                  Path("worldpointscraper.py"), Path("cleanQHDatabase.py"), Path("dbdelta.py"), Path("xref.py"),
+                  Path("jsonio.py")],
+          outputs=[Path("worldpoints.json"), Path("entity_xref.json")],
+          args=["--delta"]),
+    Stage("run_all", "run_all.py",
+          inputs=[Path("steps_parsed.json"), Path("worldpoints.json"), Path("entity_xref.json"), Path("OSRS ID List.json"),
+                  Path("run_all.py"), Path("resolve_entities.py"), Path("dbdelta.py"), Path("xref.py"),
+                  Path("generate_java.py"), Path("jsonio.py")],
+          outputs=[Path("QuestFromWiki.java")],
+          deps=["parse_steps", "worldpointscraper"],
+          args=["--parsed", "steps_parsed.json"]),
+]
+
+class StageState:
+    """Recorded digests per stage plus a (size, mtime) -> sha1 cache per file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.stages: Dict[str, Dict[str, str]] = {}
+        self.files: Dict[str, List] = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self.stages = data.get("stages", {})
+                self.files = data.get("files", {})
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"[WARN] Ignoring unreadable {path}: {e}")
+
+    def save(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages, "files": self.files}, f, indent=2)
+
+    def file_hash(self, path: Path) -> str:
+        # Re-hash only files whose size or mtime moved since the last run, so
+        # unchanged multi-thousand-file trees cost one stat() per file.
+        st = path.stat()
+        key = str(path)
+        cached = self.files.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.files[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, paths: List[Path]) -> Tuple[str, List[str]]:
+        """Combined digest of paths (directories are walked); also returns missing paths."""
+        h = hashlib.sha1()
+        missing = []
+        for p in paths:
+            if p.is_dir():
+                for fp in sorted(p.rglob("*.java")):
+                    h.update(str(fp.relative_to(p)).encode())
+                    h.update(self.file_hash(fp).encode())
+            elif p.is_file():
+                h.update(str(p).encode())
+                h.update(self.file_hash(p).encode())
+            else:
+                h.update(f"missing:{p}".encode())
+                missing.append(str(p))
+        return h.hexdigest(), missing
+
+def check_stage(stage: Stage, state: StageState, root: Path, force: bool = False) -> Tuple[bool, str, str]:
+    """Return (needs_run, reason, input_digest) for a stage."""
+    inputs = [root / p for p in stage.inputs]
+    in_digest, _ = state.digest(inputs)
+    if force:
+        return True, "forced", in_digest
+    recorded = state.stages.get(stage.name)
+    if recorded is None:
+        return True, "no previous run recorded", in_digest
+    if recorded.get("inputs") != in_digest:
+        return True, "inputs changed", in_digest
+    out_digest, missing = state.digest([root / p for p in stage.outputs])
+    if missing:
+        return True, f"output missing: {', '.join(missing)}", in_digest
+    if recorded.get("outputs") != out_digest:
+        return True, "outputs modified since last run", in_digest
+    return False, "inputs unchanged", in_digest
+
+print_lock = threading.Lock()
+
+def start_stage(stage: Stage, root: Path) -> Tuple[subprocess.Popen, Optional[str], float]:
+    """Start one stage's script; returns (process, profile report path, start time)."""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    profiler = profiling.active()
+    extra, report = profiler.subprocess_args(stage.name) if profiler else ([], None)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, str(root / stage.script), *stage.args, *extra],
+        cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, encoding="utf-8", errors="replace",
+    )
+    return proc, report, started
+
+def finish_stage(stage: Stage, root: Path, proc: subprocess.Popen, report: Optional[str], started: float) -> int:
+    """Stream a started stage's output with a [stage] prefix and wait for it."""
+    profiler = profiling.active()
+    for line in proc.stdout:
+        with print_lock:
+            print(f"[{stage.name}] {line}", end="", flush=True)
+    code = proc.wait()
+    if profiler:
+        profiler.record(stage.name, time.perf_counter() - started, report, exit_code=code,
+                        inputs=profiling.path_sizes(root / p for p in stage.inputs),
+                        outputs=profiling.path_sizes(root / p for p in stage.outputs))
+    return code
+
+def run_stages(root: Path, stages: Optional[List[Stage]] = None, force: bool = False,
+               skip: Iterable[str] = ()) -> List[Tuple[str, str, str]]:
+    """
+    Run the stage graph, starting every stage as soon as its dependencies are
+    done and skipping up-to-date ones. Stages named in skip have had their
+    outputs produced by the caller; they are not run and count as done for
+    their dependents. Returns a report of (stage, status, reason) tuples;
+    raises CalledProcessError on the first failing stage after terminating
+    any stages still running.
+    """
+    skip = set(skip)
+    stages = STAGES if stages is None else stages
+    by_name = {s.name: s for s in stages}
+    state = StageState(root / STATE_FILE)
+    report = []
+    pending = list(stages)
+    done: set = set()
+    running: Dict[str, str] = {}  # stage name -> input digest
+    procs: Dict[str, subprocess.Popen] = {}
+    finished: "queue.Queue[Tuple[str, int]]" = queue.Queue()
+    failure: Optional[subprocess.CalledProcessError] = None
+
+    def worker(stage: Stage, proc: subprocess.Popen, profile_report: Optional[str], started: float) -> None:
+        try:
+            code = finish_stage(stage, root, proc, profile_report, started)
+        except OSError as e:
+            with print_lock:
+                print(f"[{stage.name}] Error: {e}", flush=True)
+            code = 1
+        finished.put((stage.name, code))
+
+    try:
+        while pending or running:
+            # All hashing happens on this thread; workers only run processes.
+            for stage in list(pending):
+                if failure is not None:
+                    break
+                if any(d in by_name and d not in done for d in stage.deps):
+                    continue
+                pending.remove(stage)
+                if stage.name in skip:
+                    report.append((stage.name, "skipped", "outputs written by the caller"))
+                    done.add(stage.name)
+                    continue
+                if not (root / stage.script).is_file():
+                    print(f"[WARN] {stage.script} not found; skipping.")
+                    report.append((stage.name, "skipped", "script not found"))
+                    done.add(stage.name)
+                    continue
+                needs_run, reason, in_digest = check_stage(stage, state, root, force)
+                if not needs_run:
+                    print(f"[INFO] {stage.script} is up to date; skipping.")
+                    report.append((stage.name, "skipped", reason))
+                    done.add(stage.name)
+                    if profiling.active():
+                        profiling.active().record(stage.name, 0.0, skipped=reason)
+                    continue
+                print(f"[INFO] Running {stage.script} ({reason}) …", flush=True)
+                running[stage.name] = in_digest
+                report.append((stage.name, "running", reason))
+                # Started here rather than in the worker so a failure elsewhere
+                # always finds the process in procs to terminate it.
+                try:
+                    procs[stage.name], profile_report, started = start_stage(stage, root)
+                except OSError as e:
+                    with print_lock:
+                        print(f"[{stage.name}] Error: {e}", flush=True)
+                    finished.put((stage.name, 1))
+                    continue
+                threading.Thread(target=worker, args=(stage, procs[stage.name], profile_report, started),
+                                 daemon=True).start()
+
+            if not running:
+                if pending and failure is None:
+                    # Only reachable if a dependency names a stage that never completes.
+                    raise RuntimeError(f"Unsatisfiable stage dependencies: {[s.name for s in pending]}")
+                break
+
+            name, code = finished.get()
+            in_digest = running.pop(name)
+            idx = next(i for i, r in enumerate(report) if r[0] == name)
+            if code != 0 and failure is not None:
+                report[idx] = (name, "aborted", "another stage failed")
+                continue
+            if code != 0:
+                report[idx] = (name, "failed", f"exit code {code}")
+                failure = subprocess.CalledProcessError(code, by_name[name].script)
+                for other, proc in list(procs.items()):
+                    if other in running and proc.poll() is None:
+                        proc.terminate()
+                continue
+            stage = by_name[name]
+            out_digest, _ = state.digest([root / p for p in stage.outputs])
+            state.stages[name] = {"inputs": in_digest, "outputs": out_digest}
+            report[idx] = (name, "ran", report[idx][2])
+            done.add(name)
+
+        for stage in pending:
+            report.append((stage.name, "not run", "an upstream stage failed"))
+    finally:
+        state.save()
+        print_report(report)
+    if failure is not None:
+        raise failure
+    return report
+
+def print_report(report: List[Tuple[str, str, str]]) -> None:
+    if not report:
+        return
+    print("\n[INFO] Stage report:")
+    width = max(len(name) for name, _, _ in report)
+    for name, status, reason in report:
+        print(f"  {name:<{width}}  {status:<7}  {reason}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the helper script stages, skipping up-to-date ones.")
+    ap.add_argument("--force", action="store_true", help="Run every stage regardless of recorded hashes")
+    profiling.add_arguments(ap, "stages")
+    args = ap.parse_args()
+    profiling.start("stages", args.profile, args.profile_dump)
+    try:
+        run_stages(Path(__file__).resolve().parent, force=args.force)
+    except subprocess.CalledProcessError as exc:
+        sys.exit(exc.returncode)
+
+if __name__ == "__main__":
+    main()
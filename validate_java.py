@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+validate_java.py
+Offline check of the NpcID/ObjectID/ItemID constants referenced by a generated
+quest helper, against the RuneLite constant files, so bad references show up
+without a Gradle build of the plugin.
+
+Each class is looked up where the generated imports point
+(runelite-api/.../net/runelite/api/<Class>.java), falling back to the gameval
+package. The parsed constants are cached in constants_index.json and only
+re-parsed when a source file changes. Unknown references get suggestions: the
+constants with the id a NAME_<id> reference ends in, else the closest names.
+References to a class without a source file cannot be checked and count as
+problems too, unless --allow-missing-sources is given.
+
+  python validate_java.py QuestFromWiki.java
+"""
+import argparse
+import bisect
+import difflib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import profiling
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+API_DIR = Path("runelite") / "runelite-api" / "src" / "main" / "java" / "net" / "runelite" / "api"
+CLASSES = ("NpcID", "ObjectID", "ItemID")
+INDEX_VERSION = 1
+
+CONSTANT_RE = re.compile(r"^\s*public\s+static\s+final\s+int\s+(\w+)\s*=\s*(-?\d+)\s*;", re.MULTILINE)
+REF_RE = re.compile(r"\b(" + "|".join(CLASSES) + r")\.([A-Za-z_][A-Za-z0-9_]*)\b")
+ID_SUFFIX_RE = re.compile(r"_(\d+)$")
+
+def constant_source(cls: str, root: Path = SCRIPT_DIR) -> Optional[Path]:
+    for path in (root / API_DIR / f"{cls}.java", root / API_DIR / "gameval" / f"{cls}.java"):
+        if path.exists():
+            return path
+    return None
+
+def parse_constants(path: Path) -> Dict[str, int]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return {name: int(value) for name, value in CONSTANT_RE.findall(f.read())}
+
+class ConstantIndex:
+    def __init__(self, classes: Dict[str, Dict[str, int]]):
+        self.classes = classes
+        self.by_value: Dict[str, Dict[int, List[str]]] = {}
+        self.sorted_names: Dict[str, List[str]] = {}
+        for cls, names in classes.items():
+            by_value: Dict[int, List[str]] = {}
+            for name, value in names.items():
+                by_value.setdefault(value, []).append(name)
+            self.by_value[cls] = by_value
+            self.sorted_names[cls] = sorted(names)
+
+    def known(self, cls: str, name: str) -> bool:
+        return name in self.classes.get(cls, {})
+
+    def suggest(self, cls: str, name: str, n: int = 3) -> List[str]:
+        """Constants with the id a NAME_<id> reference ends in, else the closest names."""
+        if cls not in self.classes:
+            return []
+        m = ID_SUFFIX_RE.search(name)
+        if m and int(m.group(1)) in self.by_value[cls]:
+            by_id = self.by_value[cls][int(m.group(1))]
+            return sorted(by_id, key=lambda c: -difflib.SequenceMatcher(None, name, c).ratio())[:n]
+        # Compare against names sharing the first word only; the whole list is too slow for difflib.
+        names = self.sorted_names[cls]
+        head = name.split("_", 1)[0][:4]
+        lo = bisect.bisect_left(names, head)
+        hi = bisect.bisect_left(names, head + "\uffff")
+        return difflib.get_close_matches(name, names[lo:hi] or names, n=n, cutoff=0.6)
+
+def load_index(root: Path = SCRIPT_DIR, cache_path: Optional[Path] = None) -> ConstantIndex:
+    """Constants of every class that has a source file, re-parsing only the changed ones."""
+    cache_path = cache_path or root / "constants_index.json"
+    cache: Dict[str, Any] = {}
+    if cache_path.exists():
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("version") != INDEX_VERSION:
+                cache = {}
+        except (OSError, json.JSONDecodeError):
+            cache = {}
+    entries = cache.get("classes", {})
+
+    classes, changed = {}, False
+    for cls in CLASSES:
+        path = constant_source(cls, root)
+        if path is None:
+            continue
+        st = path.stat()
+        stamp = [str(path.resolve()), st.st_size, st.st_mtime_ns]
+        entry = entries.get(cls)
+        if entry is None or entry["source"] != stamp:
+            entry = entries[cls] = {"source": stamp, "constants": parse_constants(path)}
+            changed = True
+            profiling.count("constant_files_parsed")
+        classes[cls] = entry["constants"]
+    if changed:
+        tmp = f"{cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "classes": entries}, f, separators=(",", ":"))
+        os.replace(tmp, cache_path)
+    return ConstantIndex(classes)
+
+def find_refs(java_text: str) -> List[Tuple[int, str, str]]:
+    """(line, class, constant) for every NpcID/ObjectID/ItemID reference outside import lines."""
+    refs = []
+    for line_no, line in enumerate(java_text.splitlines(), 1):
+        if line.lstrip().startswith("import "):
+            continue
+        refs.extend((line_no, cls, name) for cls, name in REF_RE.findall(line))
+    return refs
+
+def validate_text(java_text: str, index: ConstantIndex, allow_missing: bool = False) -> List[Dict[str, Any]]:
+    """
+    Problems as {"line", "ref", "suggestions"}, plus "missing_source" for
+    references to a class without a source file (skipped with allow_missing).
+    """
+    problems = []
+    suggestions: Dict[Tuple[str, str], List[str]] = {}
+    refs = find_refs(java_text)
+    for line_no, cls, name in refs:
+        if cls not in index.classes:
+            if not allow_missing:
+                problems.append({"line": line_no, "ref": f"{cls}.{name}", "suggestions": [], "missing_source": True})
+            continue
+        if index.known(cls, name):
+            continue
+        if (cls, name) not in suggestions:
+            suggestions[cls, name] = index.suggest(cls, name)
+        problems.append({"line": line_no, "ref": f"{cls}.{name}", "suggestions": suggestions[cls, name]})
+    profiling.count("constant_refs_checked", len(refs))
+    profiling.count("constant_refs_unknown", len(problems))
+    return problems
+
+def validate_file(java_path: Path, root: Path = SCRIPT_DIR, allow_missing: bool = False) -> List[Dict[str, Any]]:
+    index = load_index(root)
+    missing = [cls for cls in CLASSES if cls not in index.classes]
+    if missing and allow_missing:
+        print(f"Warning: no RuneLite source for {', '.join(missing)}; those references are not checked", file=sys.stderr)
+    return validate_text(Path(java_path).read_text(encoding="utf-8"), index, allow_missing)
+
+def report(java_path: Path, problems: List[Dict[str, Any]]) -> bool:
+    """Print the problems; returns True when there are none."""
+    for p in problems:
+        if p.get("missing_source"):
+            print(f"{java_path}:{p['line']}: cannot check {p['ref']}: no RuneLite source for "
+                  f"{p['ref'].split('.', 1)[0]} under {API_DIR}", file=sys.stderr)
+            continue
+        hint = f" (did you mean {', '.join(p['suggestions'])}?)" if p["suggestions"] else ""
+        print(f"{java_path}:{p['line']}: unknown constant {p['ref']}{hint}", file=sys.stderr)
+    if problems:
+        print(f"Error: {len(problems)} unknown or unchecked constant references in {java_path}", file=sys.stderr)
+    else:
+        print(f"All constant references in {java_path} resolve")
+    return not problems
+
+def main():
+    ap = argparse.ArgumentParser(description="Check generated Java against the RuneLite NpcID/ObjectID/ItemID constants.")
+    ap.add_argument("java", nargs="+", type=Path)
+    ap.add_argument("--root", type=Path, default=SCRIPT_DIR, help="Folder containing the runelite checkout")
+    ap.add_argument("--allow-missing-sources", action="store_true",
+                    help="Only warn about classes whose RuneLite source is missing instead of failing")
+    profiling.add_arguments(ap, "validate_java")
+    args = ap.parse_args()
+    profiling.start("validate_java", args.profile, args.profile_dump)
+
+    ok = True
+    for java_path in args.java:
+        with profiling.stage("validate", [java_path]):
+            ok = report(java_path, validate_file(java_path, args.root, args.allow_missing_sources)) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+watch.py
+Long-running watch mode for run_all.py --watch.
+Polls the wiki input, worldpoints.json, OSRS ID List.json, entity_xref.json,
+the stage scripts and the quest-helper tree. On a change only the affected
+work is redone:
+  - quest-helper tree   -> worldpointscraper (skip-aware stage)
+  - wiki.txt            -> cleanwiki into the cleaned input
+  - worldpoints.json    -> apply worldpoints.patch.json when it leads from the
+                           loaded file to the new one and re-resolve only the
+                           sections naming a touched entity; otherwise as below
+  - databases           -> reload them, re-resolve every section
+  - entity_xref.json    -> reload it; no section is redone
+  - stage scripts       -> reload the module, re-parse every section
+  - cleaned input       -> re-parse/re-resolve only the '### ' sections whose text changed
+and QuestFromWiki.java is regenerated. Databases stay loaded between runs.
+Sections keep their matches in database order; ambiguous ones are ranked by
+co-occurrence over the whole guide on every rebuild, as run_all does.
+"""
+import hashlib
+import importlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cleanwiki
+import dbdelta
+import generate_java
+import parse_steps
+import resolve_entities
+import xref
+from stages import STAGES, QH_ROOT, run_stages
+
+RELOADABLE = {"cleanwiki.py": "cleanwiki", "parse_steps.py": "parse_steps",
+              "resolve_entities.py": "resolve_entities", "generate_java.py": "generate_java"}
+
+def stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def tree_key(root: Path) -> Optional[Tuple[int, int]]:
+    """(file count, newest mtime) over the .java files of a tree."""
+    if not root.is_dir():
+        return None
+    count, newest = 0, 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(".java"):
+                count += 1
+                newest = max(newest, os.stat(os.path.join(dirpath, name)).st_mtime_ns)
+    return count, newest
+
+def split_sections(text: str) -> List[str]:
+    """Split cleaned wikitext at '### ' headings; each section is parsed on its own."""
+    sections: List[List[str]] = [[]]
+    for line in text.split("\n"):
+        if line.startswith("### ") and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    # Trailing blank lines are dropped so appending a section leaves the previous one's hash intact.
+    return [t for t in ("\n".join(s).rstrip("\n") for s in sections) if t]
+
+class WatchSession:
+    def __init__(self, root: Path, raw_wiki: Path, cleaned: Path, world: Path, items: Path,
+                 out: Path, classname: str):
+        self.root = root
+        self.raw_wiki = raw_wiki
+        self.cleaned = cleaned
+        self.world = world
+        self.items = items
+        self.out = out
+        self.classname = classname
+        self.xref_path = xref.default_path(world)
+        self.databases = None
+        self.xref_index = None
+        self.world_sha: Optional[str] = None
+        self.sections: Dict[str, List[Dict[str, Any]]] = {}  # section sha1 -> matched steps
+
+    def load_databases(self) -> None:
+        self.world_sha = dbdelta.file_sha1(self.world) if self.world.exists() else None
+        self.databases = (
+            resolve_entities.load_entities(str(self.world), "npcs"),
+            resolve_entities.load_entities(str(self.world), "objects"),
+            resolve_entities.load_items(str(self.items)),
+        )
+        self.load_xref()
+        self.sections.clear()
+
+    def load_xref(self) -> None:
+        self.xref_index = xref.XrefIndex.load_if_exists(self.xref_path)
+
+    def patch_databases(self) -> Optional[int]:
+        """
+        Apply the worldpoints patch worldpointscraper.py --delta left next to the
+        world file, dropping only the sections it affects. Returns the number of
+        sections dropped, or None if the patch does not lead from the loaded
+        file to the current one and the databases must be reloaded.
+        """
+        current = dbdelta.file_sha1(self.world) if self.world.exists() else None
+        if current == self.world_sha:
+            return 0
+        try:
+            patch = dbdelta.load_patch(dbdelta.default_patch_path(self.world))
+            if patch["base"] != self.world_sha or patch["result"] != current:
+                return None
+            npcdict, objectdict, itemdict = self.databases
+            patched = (resolve_entities.patch_entities(npcdict, patch.get("npcs", {})),
+                       resolve_entities.patch_entities(objectdict, patch.get("objects", {})))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        checks = []
+        for (names_key, matches_key, kind), old, new in zip(
+                (("npc_names", "npc_matches", "npcs"), ("object_names", "object_matches", "objects")),
+                (npcdict, objectdict), patched):
+            # New or renamed entities can change fuzzy matches, so queries that
+            # were not exact hits are redone too.
+            checks.append((names_key, matches_key, dbdelta.touched_names(patch, kind), old.keys() != new.keys(), new))
+
+        def affected(steps: List[Dict[str, Any]]) -> bool:
+            for s in steps:
+                for names_key, matches_key, names, keys_changed, entdict in checks:
+                    for name in s.get(names_key, []):
+                        for q in resolve_entities.expand_slash_variants(name):
+                            q = q.strip().lower()
+                            if q in names or (keys_changed and q not in entdict):
+                                return True
+                    if any((m.get("name") or "").strip().lower() in names for m in s.get(matches_key, [])):
+                        return True
+            return False
+
+        stale = [key for key, steps in self.sections.items() if affected(steps)]
+        for key in stale:
+            del self.sections[key]
+        self.databases = (*patched, itemdict)
+        self.world_sha = current
+        return len(stale)
+
+    def reload_module(self, module_name: str) -> None:
+        globals()[module_name] = importlib.reload(globals()[module_name])
+        self.sections.clear()
+
+    def rebuild(self) -> Tuple[int, int]:
+        """Regenerate the Java class; returns (sections reprocessed, total steps)."""
+        text = self.cleaned.read_text(encoding="latin1")
+        fresh: Dict[str, List[Dict[str, Any]]] = {}
+        merged: List[Dict[str, Any]] = []
+        redone = 0
+        for section in split_sections(text):
+            key = hashlib.sha1(section.encode("utf-8", "replace")).hexdigest()
+            steps = fresh[key] if key in fresh else self.sections.get(key)
+            if steps is None:
+                steps = resolve_entities.match_steps(parse_steps.parse_wiki_text(section), *self.databases)
+                redone += 1
+            fresh[key] = steps
+            # Copies, so ranking leaves the cached matches in database order.
+            merged.extend(dict(s) for s in steps)
+        self.sections = fresh
+        resolve_entities.choose_matches(merged, self.xref_index)
+        generate_java.generate_java(merged, self.classname, str(self.out))
+        return redone, len(merged)
+
+def watch(root: Path, cleaned: Path, world: Path, items: Path, out: Path, classname: str = "QuestFromWiki",
+          raw_wiki: Optional[Path] = None, interval: float = 0.25, tree_interval: float = 5.0) -> None:
+    raw_wiki = raw_wiki or root / "wiki.txt"
+    tree = root / QH_ROOT / "helpers"
+    session = WatchSession(root, raw_wiki, cleaned, world, items, out, classname)
+    db_stages = [s for s in STAGES if s.name == "worldpointscraper"]
+
+    files = {"raw": raw_wiki, "cleaned": cleaned, "world": world, "items": items, "xref": session.xref_path}
+    files.update({name: root / name for name in RELOADABLE})
+    seen = {name: stat_key(p) for name, p in files.items()}
+    seen_tree = tree_key(tree)
+    next_tree_poll = time.monotonic() + tree_interval
+
+    session.load_databases()
+    if cleaned.exists():
+        redone, n = session.rebuild()
+        print(f"[watch] Initial build: {redone} sections, {n} steps.")
+    print(f"[watch] Watching {cleaned.name}, {raw_wiki.name}, {world.name}, {items.name} and {tree} (Ctrl+C to stop).")
+
+    try:
+        while True:
+            time.sleep(interval)
+            changed = set()
+            for name, p in files.items():
+                key = stat_key(p)
+                if key != seen[name]:
+                    seen[name] = key
+                    changed.add(name)
+            if time.monotonic() >= next_tree_poll:
+                next_tree_poll = time.monotonic() + tree_interval
+                key = tree_key(tree)
+                if key != seen_tree:
+                    seen_tree = key
+                    changed.add("tree")
+            if not changed:
+                continue
+
+            started = time.perf_counter()
+            print(f"[watch] Changed: {', '.join(sorted(changed))}")
+            try:
+                if "tree" in changed:
+                    run_stages(root, db_stages)
+                    # The refreshed worldpoints.json and entity_xref.json are picked up below.
+                    seen["world"] = stat_key(world)
+                    seen["xref"] = stat_key(session.xref_path)
+                    changed.update(("world", "xref"))
+                for name, module_name in RELOADABLE.items():
+                    if name in changed:
+                        session.reload_module(module_name)
+                if "raw" in changed and raw_wiki.exists():
+                    cleanwiki.clean_wiki_file(raw_wiki, cleaned)
+                    seen["cleaned"] = stat_key(cleaned)
+                if "xref" in changed:
+                    session.load_xref()
+                if "items" in changed:
+                    session.load_databases()
+                elif "world" in changed:
+                    dropped = session.patch_databases()
+                    if dropped is None:
+                        session.load_databases()
+                    else:
+                        print(f"[watch] Applied {dbdelta.default_patch_path(world).name}: {dropped} sections affected")
+                redone, n = session.rebuild()
+                print(f"[watch] Rebuilt {out.name}: {redone} sections reprocessed, {n} steps "
+                      f"in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                # Keep watching; the next save usually fixes whatever broke.
+                print(f"[watch] Error: {e}")
+    except KeyboardInterrupt:
+        print("\n[watch] Stopped.")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+wikitext.py
+The one tokenizer for guide wikitext, shared by main.py, cleanwiki.py and
+parse_steps.py.
+
+parse_guide() makes a single pass over the page to find the guide start and
+the {{Var ... }} bank blocks (with their <!-- Bank N --> numbers) as character
+offsets. Each bank's lines are only tokenized when first asked for, so a range
+request never tokenizes banks outside the range. Every line becomes a Token
+whose kind says what it is (bank counter, bank comment, checklist title,
+bullet item, template open/close, skipped markup, plain text); item tokens
+expose their [[links]] and {{templates}}.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+
+DISPLAYTITLE_RE = re.compile(r"^\{\{DISPLAYTITLE:", re.MULTILINE)
+VAR_START_RE = re.compile(r"^[ \t]*\{\{Var", re.MULTILINE)
+BANK_COMMENT_RE = re.compile(r"<!--\s*Bank\s*(\d+)\s*-->", re.IGNORECASE)
+
+# Classifies a stripped line. Alternatives are tried in order, so skipped
+# markup wins over counters, comments and checklist titles.
+LINE_RE = re.compile(
+    r'(?P<skip>\{\{Youtube\|.*?\}\}|\{\{Extimage\|.*?\}\}|==.*?==)'          # {{Youtube}}, {{Extimage}}, headers
+    r'|(?P<var>\{\{Var\| bankNumber \| \{{#expr:\{{#var:bankNumber}}\+1}}\}\})'  # bankNumber counter
+    r'|<!--\s*(?:Bank\s*)?(?P<comment>\d+[AB]?)\s*-->'                        # explicit bank comments
+    r'|\{\{Checklist\|title=(?P<title>[^|]+)\|'                               # checklist start
+)
+# [[Target]] or [[Target|label]], optionally followed by dialog options like (3,1)
+LINK_RE = re.compile(r"\[\[([^\]\|]+)(?:\|([^\]]*))?\]\](?:\s*\((\d+,\d+)\))?")
+TEMPLATE_RE = re.compile(r"\{\{([^{}|]+)(?:\|([^{}]*))?\}\}")
+
+@dataclass
+class Link:
+    target: str
+    label: Optional[str] = None
+    dialog: Optional[str] = None
+
+@dataclass
+class Template:
+    name: str
+    args: List[str] = field(default_factory=list)
+
+@dataclass
+class Token:
+    kind: str  # blank, skip, var, comment, title, item, open, close, text
+    text: str  # the stripped line
+    lineno: int = 0
+    value: Optional[str] = None  # bank label for comments, raw title for checklist titles
+    _links: Optional[List[Link]] = field(default=None, repr=False)
+
+    @property
+    def links(self) -> List[Link]:
+        if self._links is None:
+            self._links = parse_links(self.text)
+        return self._links
+
+    @property
+    def templates(self) -> List[Template]:
+        return parse_templates(self.text)
+
+@dataclass
+class Bank:
+    number: Optional[int]
+    start: int
+    end: int
+    guide: "Guide" = field(repr=False)
+    _tokens: Optional[List[Token]] = field(default=None, repr=False)
+
+    @property
+    def text(self) -> str:
+        return self.guide.text[self.start:self.end]
+
+    @property
+    def tokens(self) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = list(iter_tokens(self.text.splitlines()))
+        return self._tokens
+
+    @property
+    def checklists(self) -> List[List[Token]]:
+        """Item tokens grouped per {{Checklist}} in this bank."""
+        groups: List[List[Token]] = []
+        current = None
+        for tok in self.tokens:
+            if tok.kind == "title":
+                current = []
+                groups.append(current)
+            elif tok.kind == "item" and current is not None:
+                current.append(tok)
+            elif tok.kind in ("open", "close"):
+                current = None
+        return groups
+
+@dataclass
+class Guide:
+    text: str
+    start: int
+    preamble_end: int
+    banks: List[Bank] = field(default_factory=list)
+
+    @property
+    def preamble_tokens(self) -> List[Token]:
+        return list(iter_tokens(self.text[self.start:self.preamble_end].splitlines()))
+
+    def select(self, lo: Optional[int], hi: Optional[int]) -> List[Bank]:
+        """Numbered banks within lo..hi (all numbered banks when either is None)."""
+        return [
+            b for b in self.banks
+            if b.number is not None and (lo is None or hi is None or lo <= b.number <= hi)
+        ]
+
+    def bank(self, number: int) -> List[Bank]:
+        return [b for b in self.banks if b.number == number]
+
+    def index(self) -> dict:
+        """JSON-serialisable offsets, as cached next to the fetched wikitext."""
+        return {
+            "start": self.start,
+            "preamble_end": self.preamble_end,
+            "blocks": [[b.number, b.start, b.end] for b in self.banks],
+        }
+
+    @classmethod
+    def from_index(cls, text: str, index: dict) -> "Guide":
+        guide = cls(text, index["start"], index["preamble_end"])
+        guide.banks = [Bank(no, begin, end, guide) for no, begin, end in index["blocks"]]
+        return guide
+
+def tokenize_line(raw: str, lineno: int = 0) -> Token:
+    line = raw.strip()
+    if not line:
+        return Token("blank", line, lineno)
+    m = LINE_RE.match(line)
+    if m:
+        kind = m.lastgroup
+        return Token(kind, line, lineno, m.group(kind) if kind in ("comment", "title") else None)
+    if line.startswith("*"):
+        return Token("item", line, lineno)
+    if line.startswith("{{"):
+        return Token("open", line, lineno)
+    if line.startswith("}"):
+        return Token("close", line, lineno)
+    return Token("text", line, lineno)
+
+def iter_tokens(lines: Iterable[str]) -> Iterator[Token]:
+    for lineno, raw in enumerate(lines):
+        yield tokenize_line(raw, lineno)
+
+def parse_links(text: str) -> List[Link]:
+    return [Link(t.strip(), label, dialog) for t, label, dialog in LINK_RE.findall(text)]
+
+def parse_templates(text: str) -> List[Template]:
+    return [Template(name.strip(), args.split("|") if args else []) for name, args in TEMPLATE_RE.findall(text)]
+
+def parse_guide(text: str) -> Guide:
+    """Locate the guide start and every {{Var block in one pass; tokens come later, per bank."""
+    title = DISPLAYTITLE_RE.search(text)
+    if title is None:
+        raise RuntimeError("DISPLAYTITLE line not found.")
+
+    starts = [m.start() for m in VAR_START_RE.finditer(text, title.start())]
+    guide = Guide(text, title.start(), starts[0] if starts else len(text))
+    for i, begin in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        m = BANK_COMMENT_RE.search(text, begin, end)
+        guide.banks.append(Bank(int(m.group(1)) if m else None, begin, end, guide))
+    return guide
+
+def select_tokens(guide: Guide, lo: Optional[int], hi: Optional[int]) -> Iterator[Token]:
+    """
+    Tokens of the preamble plus the selected banks, with each bank's trailing
+    '}}' lines dropped and one closing '}}' at the end - the token form of
+    main.extract_bank_blocks().
+    """
+    last = None
+    for tok in guide.preamble_tokens:
+        yield tok
+        last = tok
+    for bank in guide.select(lo, hi):
+        toks = bank.tokens
+        n = len(toks)
+        while n and toks[n - 1].text == "}}":
+            n -= 1
+        for tok in toks[:n]:
+            yield tok
+            last = tok
+    if last is None or last.text != "}}":
+        yield Token("close", "}}")
@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 import argparse
+import functools
 import json
+import multiprocessing
+import pickle
 import re
+import time
+from multiprocessing.connection import wait
 from pathlib import Path
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from tqdm import tqdm
 
+import cleanQHDatabase
+import jsonio
+import profiling
+import xref
+
 # Combined regex pattern for efficiency
 INT_RE = r"-?\d+"
 COMBINED_RE = re.compile(
@@ -131,41 +141,96 @@ def load_id_files(npc_path, object_path, custom_object_path, qh_object_path):
 def truncate_path(fullpath, base_marker="quest-helper-master"):
     return fullpath.name
 
-def process_file(args):
-    jf, idmaps = args
-    results = {
+def new_results():
+    return {
         'wps': [],
         'zones': [],
         'npcs': {},
         'objects': {},
         'missing_ids': [],
-        'invalid_zones': []  # Track invalid zones
+        'invalid_zones': [],  # Track invalid zones
+        'counts': {}  # COMBINED_RE matches per branch, for --profile
     }
-    
+
+# What a scan builds: 'lean' is what worldpoints.json and entity_xref.json need
+# (entities, points, zones, mention line numbers); 'full' adds the top-level
+# worldpoints and zone lines of the compact QH_database.json; 'debug' adds the
+# file name and line_text to every record (--verbose-mentions).
+FIELDS = ('lean', 'full', 'debug')
+
+def process_file(args, fields='debug', safe=False):
+    jf, idmaps = args
     try:
         text = jf.read_text(encoding='utf-8', errors='ignore')
+    except OSError as e:
+        print(f"Error processing {truncate_path(jf)}: {e}")
+        results = new_results()
+    else:
+        results = scan_text(text, truncate_path(jf), jf.stem, idmaps, fields=fields, safe=safe)
+    results['path'] = jf
+    return results
+
+# Lines longer than this are skipped by the safe scan (generated data tables, minified code).
+SAFE_MAX_LINE = 2000
+
+def iter_matches(text, safe=False):
+    """(match, line number) for every COMBINED_RE match. The safe variant matches
+    line by line and skips overlong lines, so a single line cannot make the
+    lazy branches backtrack over the whole file; constructs split across lines
+    are missed."""
+    if not safe:
+        for match in COMBINED_RE.finditer(text):
+            yield match, text.count('\n', 0, match.start()) + 1
+        return
+    # Split on '\n' only, so line numbers agree with the whole-text scan.
+    for line_no, line in enumerate(text.split('\n'), 1):
+        if len(line) > SAFE_MAX_LINE:
+            continue
+        for match in COMBINED_RE.finditer(line):
+            yield match, line_no
+
+def clean_line(lines, line_no):
+    line_text = lines[line_no - 1] if 0 <= line_no - 1 < len(lines) else ""
+    return line_text.replace('\t', '    ').strip()
+
+def scan_text(text, file_path, quest_name, idmaps, warn=True, fields='debug', safe=False):
+    """Scan one Java source for worldpoints, steps, zones and ID references.
+    warn=False drops the per-match warnings (missing IDs are still recorded);
+    fields picks what is recorded (see FIELDS): below 'debug' mentions are bare
+    line numbers, and 'lean' leaves out the top-level 'wps' records and zone
+    lines. safe selects the line-by-line scan of iter_matches()."""
+    full = fields != 'lean'
+    debug = fields == 'debug'
+    results = new_results()
+    counts = results['counts']
+    log = print if warn else (lambda *args: None)
+    
+    try:
         lines = text.splitlines()
-        file_path = truncate_path(jf)
-        quest_name = jf.stem
         
-        for match in COMBINED_RE.finditer(text):
-            line_no = text[:match.start()].count('\n') + 1
-            line_text = lines[line_no - 1] if 0 <= line_no - 1 < len(lines) else ""
-            line_text = line_text.replace('\t', '    ').strip()
+        for match, line_no in iter_matches(text, safe):
+            if debug:
+                loc = {'file': file_path, 'line': line_no, 'line_text': clean_line(lines, line_no)}
+            else:
+                loc = {'line': line_no}
+            mention = loc if debug else line_no
             
             # WorldPoint (direct)
             if match.group(1) is not None:
-                results['wps'].append({
-                    'x': int(match.group(1)),
-                    'y': int(match.group(2)),
-                    'plane': int(match.group(3) or 0),
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text
-                })
+                counts['worldpoint'] = counts.get('worldpoint', 0) + 1
+                if full:
+                    results['wps'].append({
+                        'x': int(match.group(1)),
+                        'y': int(match.group(2)),
+                        'plane': int(match.group(3) or 0),
+                        **loc
+                    })
             
             # WorldPoint (fromRegion, fromLocal, etc.)
             elif match.group(4) is not None:
+                counts['worldpoint_from'] = counts.get('worldpoint_from', 0) + 1
+                if not full:
+                    continue
                 ints = parse_ints(match.group(5))
                 if len(ints) >= 4:
                     rx, ry, lx, ly = ints[:4]
@@ -174,40 +239,34 @@ def process_file(args):
                         'x': rx * 64 + lx,
                         'y': ry * 64 + ly,
                         'plane': plane,
-                        'file': file_path,
-                        'line': line_no,
-                        'line_text': line_text
+                        **loc
                     })
                 elif len(ints) >= 2:
                     results['wps'].append({
                         'x': ints[0],
                         'y': ints[1],
                         'plane': ints[2] if len(ints) >= 3 else 0,
-                        'file': file_path,
-                        'line': line_no,
-                        'line_text': line_text
+                        **loc
                     })
             
             # ObjectStep
             elif match.group(6) is not None:
+                counts['object_step'] = counts.get('object_step', 0) + 1
                 obj_key = match.group(7)
                 if obj_key not in idmaps['objects']:
                     results['missing_ids'].append(('ObjectID', obj_key, file_path))
-                    print(f"Warning: ObjectID {obj_key} not found in idmaps for {file_path}")
+                    log(f"Warning: ObjectID {obj_key} not found in idmaps for {file_path}")
                     continue
                 obj_info = idmaps['objects'].get(obj_key, {})
                 obj_name = obj_info.get('name', obj_key.replace('_', ' '))
                 obj_id = obj_info.get('id')
                 wp = [int(match.group(8)), int(match.group(9)), int(match.group(10) or 0)]
-                results['wps'].append({
-                    'x': wp[0],
-                    'y': wp[1],
-                    'plane': wp[2],
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text,
-                    'entity': {'kind': 'objects', 'name': obj_name, 'id': obj_id}
-                })
+                if debug:
+                    entity = {'kind': 'objects', 'key': obj_key, 'name': obj_name, 'id': obj_id}
+                else:
+                    entity = {'kind': 'objects', 'key': obj_key}
+                if full:
+                    results['wps'].append({'x': wp[0], 'y': wp[1], 'plane': wp[2], **loc, 'entity': entity})
                 if obj_key not in results['objects']:
                     results['objects'][obj_key] = {
                         'id': obj_id,
@@ -216,32 +275,26 @@ def process_file(args):
                         'mentions': []
                     }
                 results['objects'][obj_key]['worldpoints'].append(wp)
-                results['objects'][obj_key]['mentions'].append({
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text
-                })
+                results['objects'][obj_key]['mentions'].append(mention)
             
             # NpcStep
             elif match.group(11) is not None:
+                counts['npc_step'] = counts.get('npc_step', 0) + 1
                 npc_key = match.group(12)
                 if npc_key not in idmaps['npcs']:
                     results['missing_ids'].append(('NpcID', npc_key, file_path))
-                    print(f"Warning: NpcID {npc_key} not found in idmaps for {file_path}")
+                    log(f"Warning: NpcID {npc_key} not found in idmaps for {file_path}")
                     continue
                 npc_info = idmaps['npcs'].get(npc_key, {})
                 npc_name = npc_info.get('name', npc_key.replace('_', ' '))
                 npc_id = npc_info.get('id')
                 wp = [int(match.group(13)), int(match.group(14)), int(match.group(15) or 0)]
-                results['wps'].append({
-                    'x': wp[0],
-                    'y': wp[1],
-                    'plane': wp[2],
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text,
-                    'entity': {'kind': 'npcs', 'name': npc_name, 'id': npc_id}
-                })
+                if debug:
+                    entity = {'kind': 'npcs', 'key': npc_key, 'name': npc_name, 'id': npc_id}
+                else:
+                    entity = {'kind': 'npcs', 'key': npc_key}
+                if full:
+                    results['wps'].append({'x': wp[0], 'y': wp[1], 'plane': wp[2], **loc, 'entity': entity})
                 if npc_key not in results['npcs']:
                     results['npcs'][npc_key] = {
                         'id': npc_id,
@@ -250,14 +303,11 @@ def process_file(args):
                         'mentions': []
                     }
                 results['npcs'][npc_key]['worldpoints'].append(wp)
-                results['npcs'][npc_key]['mentions'].append({
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text
-                })
+                results['npcs'][npc_key]['mentions'].append(mention)
             
             # Zone
             elif match.group(16) is not None:
+                counts['zone'] = counts.get('zone', 0) + 1
                 var_line = lines[line_no - 1]
                 variable_name_match = re.search(r'(\w+)\s*=\s*new\s+Zone', var_line)
                 variable_name = variable_name_match.group(1) if variable_name_match else "UnknownZone"
@@ -272,7 +322,7 @@ def process_file(args):
                         'line': line_no,
                         'issue': 'Negative coordinates detected'
                     })
-                    print(f"Warning: Invalid zone coordinates in {file_path} at line {line_no}: {line_text}")
+                    log(f"Warning: Invalid zone coordinates in {file_path} at line {line_no}: {clean_line(lines, line_no)}")
                     continue
                 if variable_name == "UnknownZone":
                     results['invalid_zones'].append({
@@ -281,22 +331,20 @@ def process_file(args):
                         'line': line_no,
                         'issue': 'Failed to parse variable name'
                     })
-                    print(f"Warning: Unknown zone name in {file_path} at line {line_no}: {line_text}")
-                results['zones'].append({
-                    'name': enhanced_name,
-                    'worldpoints': [wp1, wp2],
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text
-                })
+                    log(f"Warning: Unknown zone name in {file_path} at line {line_no}: {clean_line(lines, line_no)}")
+                zone = {'name': enhanced_name, 'worldpoints': [wp1, wp2]}
+                if full:
+                    zone.update(loc)
+                results['zones'].append(zone)
             
             # NpcID, ObjectID, or QHObjectID
             elif match.group(23) is not None:
+                counts['id_ref'] = counts.get('id_ref', 0) + 1
                 entity_key = match.group(24)
                 kind = 'npcs' if match.group(23) == 'NpcID' else 'objects'
                 if entity_key not in idmaps[kind]:
                     results['missing_ids'].append((kind[:-1].capitalize() + 'ID', entity_key, file_path))
-                    print(f"Warning: {kind[:-1].capitalize()}ID {entity_key} not found in idmaps for {file_path}")
+                    log(f"Warning: {kind[:-1].capitalize()}ID {entity_key} not found in idmaps for {file_path}")
                     continue
                 entity_info = idmaps[kind].get(entity_key, {})
                 entity_name = entity_info.get('name', entity_key.replace('_', ' '))
@@ -308,11 +356,7 @@ def process_file(args):
                         'worldpoints': [],
                         'mentions': []
                     }
-                results[kind][entity_key]['mentions'].append({
-                    'file': file_path,
-                    'line': line_no,
-                    'line_text': line_text
-                })
+                results[kind][entity_key]['mentions'].append(mention)
         
         return results
     except Exception as e:
@@ -366,6 +410,241 @@ def aggregate_results(results_list):
     
     return aggregated
 
+def scan_worker(conn, idmaps, fields, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        jf, safe = task
+        conn.send(process_file((jf, idmaps), fields=fields, safe=safe))
+    conn.close()
+
+class BudgetedScan:
+    """
+    Scans files across worker processes, yielding results as they finish.
+    A worker still busy with a file after `budget` seconds is killed and
+    replaced (a regex stuck in C cannot be interrupted from inside), and the
+    file is retried with the safe scan. A file that overruns the retry as
+    well yields an empty result. Over-budget files end up in self.slow and
+    every file's scan time (retries included) in self.timings.
+    """
+    
+    def __init__(self, java_files, idmaps, fields='debug', budget=30.0, workers=None,
+                 initializer=None, initargs=()):
+        self.pending = [(jf, False) for jf in java_files]
+        self.idmaps = idmaps
+        self.fields = fields
+        self.budget = budget
+        self.workers = workers or cpu_count()
+        self.initializer = initializer
+        self.initargs = initargs
+        self.busy = {}  # conn -> (process, task, start time)
+        self.idle = []
+        self.timings = {}
+        self.slow = []  # (path, seconds, outcome)
+    
+    def spawn(self):
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=scan_worker, daemon=True,
+                                       args=(child, self.idmaps, self.fields, self.initializer, self.initargs))
+        proc.start()
+        child.close()
+        self.idle.append((parent, proc))
+    
+    def dispatch(self):
+        while self.idle and self.pending:
+            conn, proc = self.idle.pop()
+            task = self.pending.pop()
+            conn.send(task)
+            self.busy[conn] = (proc, task, time.perf_counter())
+    
+    def overrun(self, conn):
+        proc, (jf, safe), started = self.busy.pop(conn)
+        proc.kill()
+        proc.join()
+        conn.close()
+        elapsed = time.perf_counter() - started
+        self.timings[jf] = self.timings.get(jf, 0.0) + elapsed
+        profiling.count("files_over_budget")
+        self.spawn()
+        if safe:
+            self.slow.append((jf, elapsed, "skipped after safe retry"))
+            print(f"\nWarning: skipping {jf}, over the {self.budget:g}s budget even with the safe scan")
+            res = new_results()
+            res['path'] = jf
+            return res
+        self.slow.append((jf, elapsed, "retried with safe scan"))
+        self.pending.append((jf, True))
+        return None
+    
+    def __iter__(self):
+        for _ in range(self.workers):
+            self.spawn()
+        try:
+            while self.pending or self.busy:
+                self.dispatch()
+                now = time.perf_counter()
+                deadline = min(started for _, _, started in self.busy.values()) + self.budget
+                for conn in wait(list(self.busy), timeout=max(0.0, deadline - now)):
+                    try:
+                        data = conn.recv_bytes()
+                    except EOFError:  # the worker died; handled like an overrun
+                        res = self.overrun(conn)
+                        if res is not None:
+                            yield res
+                        continue
+                    res = pickle.loads(data)
+                    profiling.count("result_bytes", len(data))
+                    proc, (jf, safe), started = self.busy.pop(conn)
+                    self.timings[jf] = self.timings.get(jf, 0.0) + time.perf_counter() - started
+                    self.idle.append((conn, proc))
+                    yield res
+                now = time.perf_counter()
+                for conn in [c for c, (_, _, started) in self.busy.items() if now - started > self.budget]:
+                    res = self.overrun(conn)
+                    if res is not None:
+                        yield res
+        finally:
+            # Idle workers exit normally, so per-worker profile dumps get written.
+            for conn, proc in self.idle:
+                conn.send(None)
+            for conn, proc in self.idle:
+                proc.join()
+                conn.close()
+            for conn, (proc, _, _) in self.busy.items():
+                proc.kill()
+                proc.join()
+
+class LeanBuilder:
+    """
+    Folds scan results into the lean worldpoints.json as they arrive, keeping
+    only ids, names, points and zones, so the full database never has to be
+    built. Files are merged in path order, so the output does not depend on
+    the order the pool finishes them in.
+    """
+    
+    def __init__(self):
+        self.files = {}
+    
+    def add(self, res):
+        entities = {kind: {key: (data['id'], data['name'], data['worldpoints']) for key, data in res[kind].items()}
+                    for kind in ('npcs', 'objects')}
+        zones = [{'name': z['name'], 'worldpoints': z['worldpoints']} for z in res['zones']]
+        self.files[str(res['path'])] = (entities, zones)
+    
+    def build(self):
+        data = {'npcs': {}, 'objects': {}, 'zones': []}
+        for path in sorted(self.files):
+            entities, zones = self.files[path]
+            for kind, found in entities.items():
+                for key, (ent_id, name, points) in found.items():
+                    entry = data[kind].setdefault(key, {'id': ent_id, 'name': name, 'worldpoints': []})
+                    entry['worldpoints'].extend(points)
+            data['zones'].extend(zones)
+        for kind in ('npcs', 'objects'):
+            for entry in data[kind].values():
+                entry['worldpoints'] = [list(t) for t in {tuple(wp) for wp in entry['worldpoints']}]
+        return cleanQHDatabase.build_lean(data)
+
+WP_COLUMNS = ('file', 'line', 'x', 'y', 'plane', 'kind', 'key')
+
+def aggregate_compact(results_list, src):
+    """
+    Like aggregate_results() for 'full' scans, but the file names go into one 'files' table
+    (paths relative to src) and mentions and top-level worldpoints are stored
+    as columns: mentions {'file': [idx, ...], 'line': [...]}, worldpoints
+    {'file', 'line', 'x', 'y', 'plane', 'kind', 'key'}. line_text is not
+    stored; mention_text() reads it from the sources on demand.
+    """
+    results_list = sorted(results_list, key=lambda r: r['path'])
+    aggregated = {
+        'format': 'compact',
+        'src': str(Path(src).resolve()),
+        'files': [Path(r['path']).relative_to(src).as_posix() for r in results_list],
+        'npcs': {},
+        'objects': {},
+        'worldpoints': {col: [] for col in WP_COLUMNS},
+        'zones': [],
+        'missing_ids': [],
+        'invalid_zones': []
+    }
+    wps = aggregated['worldpoints']
+    
+    for idx, res in enumerate(results_list):
+        for kind in ('npcs', 'objects'):
+            for key, data in res[kind].items():
+                if key not in aggregated[kind]:
+                    aggregated[kind][key] = {
+                        'id': data['id'],
+                        'name': data['name'],
+                        'worldpoints': [],
+                        'mentions': {'file': [], 'line': []}
+                    }
+                entry = aggregated[kind][key]
+                entry['worldpoints'].extend(data['worldpoints'])
+                entry['mentions']['file'].extend([idx] * len(data['mentions']))
+                entry['mentions']['line'].extend(data['mentions'])
+        
+        for wp in res['wps']:
+            entity = wp.get('entity', {})
+            wps['file'].append(idx)
+            wps['line'].append(wp['line'])
+            wps['x'].append(wp['x'])
+            wps['y'].append(wp['y'])
+            wps['plane'].append(wp['plane'])
+            wps['kind'].append(entity.get('kind'))
+            wps['key'].append(entity.get('key'))
+        
+        aggregated['zones'].extend({'name': zone['name'], 'worldpoints': zone['worldpoints'], 'file': idx, 'line': zone['line']}
+                                   for zone in res['zones'])
+        aggregated['missing_ids'].extend(res['missing_ids'])
+        aggregated['invalid_zones'].extend(res['invalid_zones'])
+    
+    # Deduplicate worldpoints
+    for kind in ('npcs', 'objects'):
+        for data in aggregated[kind].values():
+            data['worldpoints'] = [list(t) for t in {tuple(wp) for wp in data['worldpoints']}]
+    
+    return aggregated
+
+@functools.lru_cache(maxsize=32)
+def source_lines(path):
+    return Path(path).read_text(encoding='utf-8', errors='ignore').splitlines()
+
+def mention_text(db, file_idx, line):
+    """line_text of a compact mention, read from the scanned source."""
+    try:
+        return clean_line(source_lines(str(Path(db['src']) / db['files'][file_idx])), line)
+    except OSError:
+        return ""
+
+def iter_mentions(db, kind, key, with_text=True):
+    """Mentions of one npc/object as {'file', 'line', 'line_text'} dicts, in either format."""
+    mentions = db[kind][key]['mentions']
+    if isinstance(mentions, list):
+        yield from mentions
+        return
+    for file_idx, line in zip(mentions['file'], mentions['line']):
+        mention = {'file': db['files'][file_idx], 'line': line}
+        if with_text:
+            mention['line_text'] = mention_text(db, file_idx, line)
+        yield mention
+
+def show_mentions(db_path, key):
+    db = jsonio.load(db_path)
+    found = False
+    for kind in ('npcs', 'objects'):
+        if key in db[kind]:
+            found = True
+            entity = db[kind][key]
+            print(f"{kind[:-1]} {key} ({entity['name']}, id {entity['id']}): {len(entity['worldpoints'])} worldpoints")
+            for m in iter_mentions(db, kind, key):
+                print(f"  {m['file']}:{m['line']}: {m.get('line_text', '')}")
+    if not found:
+        print(f"Error: {key} is not in {db_path}")
+
 class CompactListEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, list):
@@ -385,63 +664,152 @@ def main():
     default_qh_object_ids = script_dir / "quest-helper-master" / "src" / "main" / "java" / "com" / "questhelper" / "util" / "QHObjectID.java"
     default_out = script_dir / 'QH_database.json'
 
-    parser = argparse.ArgumentParser(description="Scrape Quest Helper Java files for NPCs, objects, zones, and worldpoints.")
+    parser = argparse.ArgumentParser(description="Scrape Quest Helper Java files for NPCs, objects, zones, and worldpoints "
+                                                 "into worldpoints.json (and optionally the full QH_database.json).")
     parser.add_argument('--src', default=default_src, type=Path)
     parser.add_argument('--npc_ids', default=default_npc_ids, type=Path)
     parser.add_argument('--object_ids', default=default_object_ids, type=Path)
     parser.add_argument('--custom_object_ids', default=default_custom_object_ids, type=Path)
     parser.add_argument('--qh_object_ids', default=default_qh_object_ids, type=Path)
+    parser.add_argument('--world', default=script_dir / 'worldpoints.json', type=Path,
+                        help="Lean NPC/object/zone database for the resolver")
+    parser.add_argument('--delta', action='store_true',
+                        help="Patch an existing --world in place and write the changes to --patch (see dbdelta.py)")
+    parser.add_argument('--patch', default=script_dir / 'worldpoints.patch.json', type=Path)
+    parser.add_argument('--xref', default=script_dir / 'entity_xref.json', type=Path,
+                        help="Entity <-> quest cross-reference index (see xref.py)")
+    parser.add_argument('--fields', choices=FIELDS,
+                        help="What to build: lean (worldpoints.json and the xref index only), full (also the database "
+                             "at --out) or debug (--out with file names and line_text everywhere). Default: lean, "
+                             "or what --full/--cleaned/--verbose-mentions need")
+    parser.add_argument('--full', action='store_true',
+                        help="Also write the full database with mentions and all worldpoints to --out (--fields full)")
     parser.add_argument('--out', default=default_out, type=Path)
+    parser.add_argument('--cleaned', nargs='?', const=script_dir / 'QH_Cleaned.json', default=None, type=Path,
+                        help="Also write the full database with sorted keys (default: QH_Cleaned.json)")
+    parser.add_argument('--budget', type=float, default=30.0,
+                        help="Seconds a worker may spend on one file before it is retried with the safe scan")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--verbose-mentions', action='store_true',
+                        help="Store file names and line_text in every mention and worldpoint (the old format, --fields debug)")
+    parser.add_argument('--show', metavar='KEY',
+                        help="Print the mentions of an NpcID/ObjectID key in --out, with source lines, and exit")
+    profiling.add_arguments(parser, "worldpointscraper")
     args = parser.parse_args()
+    if args.show:
+        show_mentions(args.out, args.show)
+        return
+    needed = 'debug' if args.verbose_mentions else 'full' if args.full or args.cleaned is not None else 'lean'
+    fields = args.fields or needed
+    if FIELDS.index(fields) < FIELDS.index(needed):
+        parser.error(f"--fields {fields} does not build what --full/--cleaned/--verbose-mentions write")
+    write_full = args.full or (fields != 'lean' and args.cleaned is None)
+    profiler = profiling.start("worldpointscraper", args.profile, args.profile_dump)
 
-    idmaps = load_id_files(args.npc_ids, args.object_ids, args.custom_object_ids, args.qh_object_ids)
+    id_files = [args.npc_ids, args.object_ids, args.custom_object_ids, args.qh_object_ids]
+    with profiling.stage("load_id_files", id_files):
+        idmaps = load_id_files(*id_files)
+        profiling.count("npc_ids", len(idmaps['npcs']))
+        profiling.count("object_ids", len(idmaps['objects']))
     java_files = list(args.src.rglob('*.java'))
     
-    print(f"Scanning {len(java_files)} Java files...")
+    print(f"Scanning {len(java_files)} Java files ({fields} fields)...")
     
-    with Pool(processes=cpu_count()) as pool:
-        results_list = list(tqdm(
-            pool.imap_unordered(process_file, [(jf, idmaps) for jf in java_files]),
-            total=len(java_files),
-            desc="Processing Java Files"
-        ))
+    # Per-worker cProfile dumps are written as the workers exit normally.
+    initializer, initargs = None, ()
+    if profiler and args.profile_dump:
+        initializer, initargs = profiling.start_worker_dump, (args.profile_dump, "worldpointscraper")
+    keep_full = fields != 'lean'
+    lean = LeanBuilder()
+    xrefs = xref.XrefBuilder(args.src)
+    results_list = []
+    missing_ids, invalid_zones = [], []
+    with profiling.stage("scan", [args.src]):
+        scans = BudgetedScan(java_files, idmaps, fields=fields, budget=args.budget,
+                             workers=args.workers, initializer=initializer, initargs=initargs)
+        for res in tqdm(scans, total=len(java_files), desc="Processing Java Files"):
+            for branch, n in res['counts'].items():
+                profiling.count(f"combined_re.{branch}", n)
+            missing_ids.extend(res['missing_ids'])
+            invalid_zones.extend(res['invalid_zones'])
+            lean.add(res)
+            xrefs.add(res)
+            if keep_full:
+                results_list.append(res)
+        profiling.count("files_scanned", len(java_files))
     
-    aggregated = aggregate_results(results_list)
+    with profiling.stage("aggregate"):
+        lean_data = lean.build()
+        xref_index = xrefs.build()
+        if fields == 'debug':
+            aggregated = aggregate_results(results_list)
+        elif keep_full:
+            aggregated = aggregate_compact(results_list, args.src)
+    
+    slowest = sorted(scans.timings.items(), key=lambda kv: -kv[1])[:5]
+    if slowest:
+        print("\nSlowest files:")
+        for jf, seconds in slowest:
+            print(f"{seconds:8.3f}s  {jf.relative_to(args.src)}")
+    if scans.slow:
+        print(f"\n{len(scans.slow)} files went over the {args.budget:g}s budget, see slow_files.log")
+        with open(script_dir / "slow_files.log", "w", encoding='utf-8') as f:
+            for jf, seconds, outcome in scans.slow:
+                f.write(f"{jf}\t{seconds:.3f}s\t{outcome}\n")
     
     # Print summary of missing IDs
-    if aggregated['missing_ids']:
+    if missing_ids:
         print("\nMissing IDs:")
-        for kind, entity_key, file_path in aggregated['missing_ids']:
+        for kind, entity_key, file_path in missing_ids:
             print(f"{kind} {entity_key} missing in {file_path}")
-        print(f"Total missing IDs: {len(aggregated['missing_ids'])}")
+        print(f"Total missing IDs: {len(missing_ids)}")
     else:
         print("\nAll NPCs and Object IDs found in idmaps!")
     
     # Print summary of invalid zones
-    if aggregated['invalid_zones']:
+    if invalid_zones:
         print("\nInvalid Zones:")
-        for zone in aggregated['invalid_zones']:
+        for zone in invalid_zones:
             print(f"Zone {zone['name']} in {zone['file']} at line {zone['line']}: {zone['issue']}")
-        print(f"Total invalid zones: {len(aggregated['invalid_zones'])}")
+        print(f"Total invalid zones: {len(invalid_zones)}")
     else:
         print("\nAll zones parsed successfully!")
     
     # Save missing IDs to a log file
-    if aggregated['missing_ids']:
+    if missing_ids:
         with open(script_dir / "missing_ids.log", "w", encoding='utf-8') as f:
-            for kind, entity_key, file_path in aggregated['missing_ids']:
+            for kind, entity_key, file_path in missing_ids:
                 f.write(f"{kind} {entity_key} missing in {file_path}\n")
     
     # Save invalid zones to a log file
-    if aggregated['invalid_zones']:
+    if invalid_zones:
         with open(script_dir / "invalid_zones.log", "w", encoding='utf-8') as f:
-            for zone in aggregated['invalid_zones']:
+            for zone in invalid_zones:
                 f.write(f"Zone {zone['name']} in {zone['file']} at line {zone['line']}: {zone['issue']}\n")
     
-    with open(args.out, 'w', encoding='utf-8') as f:
-        json.dump(aggregated, f, indent=2, cls=CompactListEncoder)
+    # Written first: save_lean may hand a patch to the resolver daemon, which
+    # then picks up the new index along with it.
+    with profiling.stage("write_xref", outputs=[args.xref]):
+        written = xref.write(xref_index, args.xref)
+    if written:
+        print(f"Cross-reference index of {len(xref_index['quests'])} quests written to {args.xref}")
+    else:
+        print(f"Cross-reference index at {args.xref} is unchanged")
+    with profiling.stage("write", outputs=[args.world]):
+        cleanQHDatabase.save_lean(lean_data, args.world, args.delta, args.patch)
+    
+    if write_full:
+        with profiling.stage("write_full", outputs=[args.out]), jsonio.open_text(args.out, 'w') as f:
+            if fields == 'debug':
+                json.dump(aggregated, f, indent=2, cls=CompactListEncoder)
+            else:
+                json.dump(aggregated, f, separators=(',', ':'))
+        print(f"Database generated at {args.out}")
     
-    print(f"Database generated at {args.out}")
+    if args.cleaned is not None:
+        with profiling.stage("write_cleaned", outputs=[args.cleaned]):
+            cleanQHDatabase.write_sorted(aggregated, args.cleaned)
+        print(f"Generated cleaned database at {args.cleaned}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
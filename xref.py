@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+xref.py
+Cross-reference index between RuneLite entities and quest helpers, written by
+worldpointscraper.py next to worldpoints.json (entity_xref.json):
+
+  {"version": 1, "src": ..., "files": [path relative to src, ...],
+   "npcs": {KEY: {"id", "name", "refs": {"file": [idx, ...], "line": [...]}}},
+   "objects": {...},
+   "ids": {"npcs": {"4626": [KEY, ...]}, "objects": {...}},
+   "quests": {QUEST: {"files": [idx, ...], "npcs": [KEY, ...], "objects": [KEY, ...]}}}
+
+A quest is the helper's directory below src (quests/cooksassistant), or the
+file name for files directly in it. The index is a fraction of the size of
+QH_database.json, so lookups do not need the full database:
+
+  python xref.py COOK            # where an NpcID/ObjectID key is used
+  python xref.py 4626            # the same by id
+  python xref.py --quest cooksassistant
+
+resolve_entities.py uses quest co-occurrence from it to order ambiguous
+matches (see rank_by_cooccurrence there).
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import jsonio
+
+XREF_VERSION = 1
+KINDS = ("npcs", "objects")
+
+def default_path(world_path) -> Path:
+    return Path(world_path).with_name("entity_xref.json")
+
+def quest_of(rel_path: str) -> str:
+    path = PurePosixPath(rel_path)
+    return str(path.parent) if str(path.parent) != "." else path.stem
+
+class XrefBuilder:
+    """Collects entity mentions from worldpointscraper scan results, one file at a time."""
+
+    def __init__(self, src: Path):
+        self.src = Path(src)
+        self.files: Dict[str, Dict[str, Dict[str, Tuple[Any, str, List[int]]]]] = {}
+
+    def add(self, res: Dict[str, Any]) -> None:
+        rel = Path(res['path']).relative_to(self.src).as_posix()
+        # Mentions are line numbers, or location dicts from --fields debug scans.
+        self.files[rel] = {kind: {key: (data['id'], data['name'],
+                                        [m['line'] if isinstance(m, dict) else m for m in data['mentions']])
+                                  for key, data in res[kind].items()}
+                           for kind in KINDS}
+
+    def build(self) -> Dict[str, Any]:
+        files = sorted(self.files)
+        index: Dict[str, Any] = {"version": XREF_VERSION, "src": str(self.src.resolve()), "files": files,
+                                 "npcs": {}, "objects": {}, "ids": {"npcs": {}, "objects": {}}, "quests": {}}
+        for idx, rel in enumerate(files):
+            quest = index["quests"].setdefault(quest_of(rel), {"files": [], "npcs": [], "objects": []})
+            quest["files"].append(idx)
+            for kind, found in self.files[rel].items():
+                for key, (ent_id, name, lines) in found.items():
+                    entry = index[kind].get(key)
+                    if entry is None:
+                        entry = index[kind][key] = {"id": ent_id, "name": name, "refs": {"file": [], "line": []}}
+                        index["ids"][kind].setdefault(str(ent_id), []).append(key)
+                    entry["refs"]["file"].extend([idx] * len(lines))
+                    entry["refs"]["line"].extend(lines)
+                    if key not in quest[kind]:
+                        quest[kind].append(key)
+        for kind in KINDS:
+            index[kind] = {k: index[kind][k] for k in sorted(index[kind])}
+        index["quests"] = {q: index["quests"][q] for q in sorted(index["quests"])}
+        return index
+
+def write(index: Dict[str, Any], path) -> bool:
+    """Write index to path unless the file already holds it; returns True if it was written."""
+    text = json.dumps(index, separators=(",", ":"))
+    if Path(path).exists():
+        try:
+            with jsonio.open_text(path) as f:
+                if f.read() == text:
+                    return False
+        except (OSError, EOFError, ValueError):
+            pass
+    with jsonio.open_text(path, "w") as f:
+        f.write(text)
+    return True
+
+class XrefIndex:
+    def __init__(self, data: Dict[str, Any]):
+        if data.get("version") != XREF_VERSION:
+            raise ValueError(f"unsupported xref version {data.get('version')!r}")
+        self.data = data
+        self.files: List[str] = data["files"]
+        self._quest_of_file = {idx: quest for quest, q in data["quests"].items() for idx in q["files"]}
+
+    @classmethod
+    def load(cls, path) -> "XrefIndex":
+        return cls(jsonio.load(path))
+
+    @classmethod
+    def load_if_exists(cls, path) -> Optional["XrefIndex"]:
+        """The index at path, or None (with a warning if it exists but cannot be read)."""
+        if not Path(path).exists():
+            return None
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: ignoring {path}: {e}", file=sys.stderr)
+            return None
+
+    def keys(self, ref: str, kinds: Iterable[str] = KINDS) -> List[Tuple[str, str]]:
+        """(kind, key) pairs for an NpcID/ObjectID key or a numeric id."""
+        found = []
+        for kind in kinds:
+            if ref in self.data[kind]:
+                found.append((kind, ref))
+            found.extend((kind, key) for key in self.data["ids"][kind].get(ref, []) if key != ref)
+        return found
+
+    def refs(self, kind: str, key: str) -> List[Tuple[str, int]]:
+        """(quest file, line) pairs where an entity is used."""
+        refs = self.data[kind].get(key, {}).get("refs", {"file": [], "line": []})
+        return [(self.files[f], line) for f, line in zip(refs["file"], refs["line"])]
+
+    def quests(self, kind: str, key: str) -> Set[str]:
+        refs = self.data[kind].get(key, {}).get("refs", {"file": []})
+        return {self._quest_of_file[f] for f in set(refs["file"])}
+
+    def quests_for_id(self, kind: str, ent_id: Any) -> Set[str]:
+        quests: Set[str] = set()
+        for key in self.data["ids"][kind].get(str(ent_id), []):
+            quests |= self.quests(kind, key)
+        return quests
+
+    def entities(self, quest: str) -> Dict[str, List[str]]:
+        q = self.data["quests"].get(quest, {})
+        return {kind: q.get(kind, []) for kind in KINDS}
+
+    def find_quests(self, text: str) -> List[str]:
+        """Quests whose name matches text exactly, else those containing it (case-insensitive)."""
+        text = text.lower()
+        exact = [q for q in self.data["quests"] if q.lower() == text or q.lower().rsplit("/", 1)[-1] == text]
+        return exact or [q for q in self.data["quests"] if text in q.lower()]
+
+    def cooccurrence(self, kind: str, ent_id: Any, context: Counter) -> int:
+        """How often the quests using an entity appear in context (quest -> count)."""
+        return sum(context[q] for q in self.quests_for_id(kind, ent_id))
+
+def main():
+    script_dir = Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Look up where NPCs/objects are used across the quest helpers.")
+    ap.add_argument("ref", nargs="*", help="NpcID/ObjectID keys or numeric ids")
+    ap.add_argument("--quest", action="append", default=[], help="List the entities a quest helper uses")
+    ap.add_argument("--kind", choices=KINDS, help="Only look in npcs or objects")
+    ap.add_argument("--index", type=Path, default=script_dir / "entity_xref.json")
+    args = ap.parse_args()
+    if not args.ref and not args.quest:
+        ap.error("give an entity key/id or --quest")
+
+    try:
+        index = XrefIndex.load(args.index)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read {args.index}: {e} (run worldpointscraper.py first)", file=sys.stderr)
+        sys.exit(1)
+
+    status = 0
+    for ref in args.ref:
+        found = index.keys(ref, [args.kind] if args.kind else KINDS)
+        if not found:
+            print(f"{ref}: not used by any quest helper")
+            status = 1
+        for kind, key in found:
+            entry = index.data[kind][key]
+            refs = index.refs(kind, key)
+            print(f"{kind[:-1]} {key} ({entry['name']}, id {entry['id']}): "
+                  f"{len(refs)} references in {len(index.quests(kind, key))} quests")
+            for file, line in refs:
+                print(f"  {file}:{line}")
+    for text in args.quest:
+        quests = index.find_quests(text)
+        if not quests:
+            print(f"{text}: no such quest")
+            status = 1
+        for quest in quests:
+            entities = index.entities(quest)
+            print(f"{quest}: {len(entities['npcs'])} npcs, {len(entities['objects'])} objects")
+            for kind in KINDS:
+                for key in entities[kind]:
+                    print(f"  {kind[:-1]} {key} ({index.data[kind][key]['name']})")
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()